@@ -1,13 +1,15 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Query, status
 from typing import List, Optional
 from datetime import datetime
+import os
 
 from schemas import UserRegister, UserLogin, UserResponse, PostCreate, PostResponse
 from models import (
     create_user, authenticate_user, create_post, 
-    get_user_by_id, get_post_by_id, get_all_posts,
+    get_user_by_id, get_post_by_id, get_posts, get_posts_by_author,
     update_post, delete_post,  
-    users_db, posts_db
+    users_db, posts_db,
+    enable_persistence, disable_persistence
 )
 
 # 创建FastAPI应用
@@ -20,6 +22,20 @@ app = FastAPI(
 # 全局变量：简单的登录状态管理（Day6会用JWT替换）
 current_user_id: Optional[int] = None
 
+# 可选持久化：设置 BLOG_DATA_DIR 后数据写入该目录，重启后自动恢复
+DATA_DIR = os.getenv("BLOG_DATA_DIR")
+
+@app.on_event("startup")
+def startup_event():
+    """启动时回放持久化数据"""
+    if DATA_DIR:
+        enable_persistence(DATA_DIR)
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """关闭时把剩余日志写入磁盘"""
+    disable_persistence()
+
 # ===== 根路由 =====
 
 @app.get("/")
@@ -142,9 +158,25 @@ def create_new_post(post_data: PostCreate):
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/posts", response_model=List[PostResponse])
-def list_posts():
-    """获取文章列表"""
-    posts = get_all_posts()
+def list_posts(
+    skip: int = Query(0, ge=0, description="跳过的文章数"),
+    limit: int = Query(100, ge=1, le=100, description="返回的文章数，最大100")
+):
+    """获取文章列表（按创建时间倒序，支持分页）"""
+    posts = get_posts(skip=skip, limit=limit)
+    return [PostResponse(**post) for post in posts]
+
+@app.get("/users/{user_id}/posts", response_model=List[PostResponse])
+def list_user_posts(
+    user_id: int,
+    skip: int = Query(0, ge=0, description="跳过的文章数"),
+    limit: int = Query(100, ge=1, le=100, description="返回的文章数，最大100")
+):
+    """获取指定用户的文章列表（按创建时间倒序，支持分页）"""
+    if not get_user_by_id(user_id):
+        raise HTTPException(status_code=404, detail="用户不存在")
+    
+    posts = get_posts_by_author(user_id, skip=skip, limit=limit)
     return [PostResponse(**post) for post in posts]
 
 @app.get("/posts/{post_id}", response_model=PostResponse)
@@ -1,110 +1,483 @@
-from typing import Dict, Optional
-from datetime import datetime
+import threading
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from itertools import count
+from typing import Dict, Hashable, List, Optional, Tuple
+from datetime import datetime, timedelta
 
 from schemas import UserRegister, PostCreate
+from persistence import PersistenceEngine
+
+# ===== 记录类型 =====
+
+class Record:
+    """紧凑记录基类
+
+    用__slots__代替dict保存字段，每条记录省掉一个哈希表；
+    同时保留dict风格的读取接口，user["id"]、PostResponse(**post) 等写法不变
+    """
+    __slots__ = ()
+    _fields: tuple = ()
+
+    def keys(self):
+        return self._fields
+
+    def __getitem__(self, key: str):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return self[key] if key in self._fields else default
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self._fields}
+
+class UserRecord(Record):
+    """用户记录"""
+    __slots__ = ("id", "username", "email", "password", "created_at")
+    _fields = __slots__
+
+    def __init__(self, id: int, username: str, email: str, password: str, created_at: datetime):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.password = password
+        self.created_at = created_at
+
+# 作者已被删除时文章显示的作者名
+DELETED_AUTHOR_NAME = "已删除用户"
+
+class PostRecord(Record):
+    """文章记录
+
+    作者名不再冗余存储，读取时从用户表取，改名后也不需要同步文章；
+    读取不加锁，作者刚被删除时（文章可能已被其他线程取到）返回 DELETED_AUTHOR_NAME
+    """
+    __slots__ = ("id", "title", "content", "author_id", "created_at", "updated_at")
+    _fields = __slots__ + ("author_name",)
+
+    def __init__(self, id: int, title: str, content: str, author_id: int,
+                 created_at: datetime, updated_at: datetime):
+        self.id = id
+        self.title = title
+        self.content = content
+        self.author_id = author_id
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    @property
+    def author_name(self) -> str:
+        author = users_db.get(self.author_id)
+        return author.username if author is not None else DELETED_AUTHOR_NAME
 
 # ===== 内存存储 =====
-users_db: Dict[int, dict] = {}
-posts_db: Dict[int, dict] = {}
-user_id_counter = 1
-post_id_counter = 1
+users_db: Dict[int, UserRecord] = {}
+posts_db: Dict[int, PostRecord] = {}
+# 二级索引：用户名/邮箱 -> 用户ID，唯一性检查和登录都是O(1)
+username_index: Dict[str, int] = {}
+email_index: Dict[str, int] = {}
+# 有序索引：按 (created_at, id) 升序排列，分页时从尾部切片即可得到最新文章
+post_order: List[Tuple[datetime, int]] = []
+author_post_order: Dict[int, List[Tuple[datetime, int]]] = {}
+
+# ===== 并发控制 =====
+# v1的接口是普通def函数，FastAPI会在线程池中并发执行它们
+
+class IdAllocator:
+    """自增ID分配器
+
+    next(itertools.count) 在CPython中是原子操作，多线程分配ID无需加锁。
+    last 只用于快照元信息，并发时可能略小于真实值；回放时会用记录中的ID校正
+    """
+
+    def __init__(self, start: int = 1):
+        self.reset(start)
+
+    def reset(self, start: int = 1) -> None:
+        self._counter = count(start)
+        self.last = start - 1
+
+    def allocate(self) -> int:
+        value = next(self._counter)
+        self.last = value
+        return value
+
+    def ensure_above(self, value: int) -> None:
+        """保证之后分配的ID大于value（只在单线程回放时调用）"""
+        if value > self.last:
+            self.reset(value + 1)
+
+user_ids = IdAllocator()
+post_ids = IdAllocator()
+
+# 分段锁：按用户名/邮箱/用户ID哈希到固定数量的锁上，
+# 不同用户的写操作互不阻塞；一个作者的文章写操作都持有该作者ID对应的锁
+LOCK_STRIPES = 64
+_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+# 全局文章有序索引的锁，只在插入/删除索引项时短暂持有
+_order_lock = threading.Lock()
+
+@contextmanager
+def _locked(*keys: Hashable):
+    """按固定顺序获取多个分段锁，避免死锁"""
+    stripes = sorted({hash(key) % LOCK_STRIPES for key in keys})
+    for i in stripes:
+        _locks[i].acquire()
+    try:
+        yield
+    finally:
+        for i in reversed(stripes):
+            _locks[i].release()
 
 def get_next_user_id() -> int:
     """获取下一个用户ID"""
-    global user_id_counter
-    current_id = user_id_counter
-    user_id_counter += 1
-    return current_id
+    return user_ids.allocate()
 
 def get_next_post_id() -> int:
     """获取下一个文章ID"""
-    global post_id_counter
-    current_id = post_id_counter
-    post_id_counter += 1
-    return current_id
+    return post_ids.allocate()
+
+# 持久化引擎（可选），未启用时为None
+journal: Optional[PersistenceEngine] = None
+
+def reset_store() -> None:
+    """清空内存存储（测试和压测用）"""
+    users_db.clear()
+    posts_db.clear()
+    username_index.clear()
+    email_index.clear()
+    post_order.clear()
+    author_post_order.clear()
+    user_ids.reset()
+    post_ids.reset()
+
+# ===== 存储维护（业务函数和日志回放共用） =====
+
+def _put_user(user: UserRecord) -> None:
+    """写入/替换用户记录并维护索引（调用方持有该用户相关的分段锁）"""
+    old = users_db.get(user.id)
+    if old is not None:
+        username_index.pop(old.username, None)
+        email_index.pop(old.email, None)
+    users_db[user.id] = user
+    username_index[user.username] = user.id
+    email_index[user.email] = user.id
+
+def _remove_user(user_id: int) -> Optional[UserRecord]:
+    """删除用户及其文章并维护索引（调用方持有该用户相关的分段锁）
+
+    先删文章再删用户：不加锁的读者不会通过列表/详情读到作者已不存在的文章
+    """
+    user = users_db.get(user_id)
+    if user is None:
+        return None
+    for _, post_id in list(author_post_order.get(user_id, ())):
+        _remove_post(post_id)
+    del users_db[user_id]
+    username_index.pop(user.username, None)
+    email_index.pop(user.email, None)
+    return user
+
+def _index_insert(order: List[Tuple[datetime, int]], key: Tuple[datetime, int]) -> None:
+    """插入有序索引；新文章通常是最新的，直接追加到末尾"""
+    if not order or key > order[-1]:
+        order.append(key)
+    else:
+        insort(order, key)
+
+def _index_remove(order: List[Tuple[datetime, int]], key: Tuple[datetime, int]) -> None:
+    """从有序索引中删除（二分查找定位）"""
+    i = bisect_left(order, key)
+    if i < len(order) and order[i] == key:
+        del order[i]
+
+def _put_post(post: PostRecord) -> None:
+    """写入/替换文章记录并维护有序索引（调用方持有作者ID对应的分段锁）"""
+    old = posts_db.get(post.id)
+    posts_db[post.id] = post
+    if old is None or old.created_at != post.created_at or old.author_id != post.author_id:
+        if old is not None:
+            old_key = (old.created_at, old.id)
+            with _order_lock:
+                _index_remove(post_order, old_key)
+            _index_remove(author_post_order[old.author_id], old_key)
+        key = (post.created_at, post.id)
+        with _order_lock:
+            _index_insert(post_order, key)
+        _index_insert(author_post_order.setdefault(post.author_id, []), key)
+
+def _remove_post(post_id: int) -> Optional[PostRecord]:
+    """删除文章并维护有序索引（调用方持有作者ID对应的分段锁）"""
+    post = posts_db.pop(post_id, None)
+    if post is not None:
+        key = (post.created_at, post.id)
+        with _order_lock:
+            _index_remove(post_order, key)
+        author_order = author_post_order[post.author_id]
+        _index_remove(author_order, key)
+        if not author_order:
+            del author_post_order[post.author_id]
+    return post
+
+# ===== 持久化 =====
+# 日志/快照中的操作格式：
+#   ("user", id, username, email, password, created_at)
+#   ("post", id, title, content, author_id, created_at, updated_at)
+#   ("del_user", id) / ("del_post", id) / ("meta", 最后分配的用户ID, 最后分配的文章ID)
+# 时间保存为距 _EPOCH 的整数微秒，编解码精确且比ISO字符串快
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+def _encode_time(value: datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+def _decode_time(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+def _user_op(user: UserRecord) -> tuple:
+    return ("user", user.id, user.username, user.email, user.password,
+            _encode_time(user.created_at))
+
+def _post_op(post: PostRecord) -> tuple:
+    return ("post", post.id, post.title, post.content, post.author_id,
+            _encode_time(post.created_at), _encode_time(post.updated_at))
+
+def _log(op: tuple) -> None:
+    """记录一条操作日志（未启用持久化时什么都不做）"""
+    if journal is not None:
+        journal.append(op)
+
+def apply_op(op) -> None:
+    """回放一条日志/快照记录（幂等，启动时单线程执行）"""
+    kind = op[0]
+    if kind == "post":
+        _, post_id, title, content, author_id, created_at, updated_at = op
+        post_ids.ensure_above(post_id)
+        created = _decode_time(created_at)
+        _put_post(PostRecord(
+            id=post_id,
+            title=title,
+            content=content,
+            author_id=author_id,
+            created_at=created,
+            updated_at=created if updated_at == created_at else _decode_time(updated_at)
+        ))
+    elif kind == "user":
+        _, user_id, username, email, password, created_at = op
+        user_ids.ensure_above(user_id)
+        _put_user(UserRecord(
+            id=user_id,
+            username=username,
+            email=email,
+            password=password,
+            created_at=_decode_time(created_at)
+        ))
+    elif kind == "del_post":
+        _remove_post(op[1])
+    elif kind == "del_user":
+        _remove_user(op[1])
+    elif kind == "meta":
+        user_ids.ensure_above(op[1])
+        post_ids.ensure_above(op[2])
+
+def dump_ops():
+    """导出快照内容：元信息 + 全部用户 + 全部文章"""
+    # list()在持有GIL时一次完成，不会遇到迭代中字典被修改的问题
+    users = list(users_db.values())
+    posts = list(posts_db.values())
+    yield ("meta", user_ids.last, post_ids.last)
+    for user in users:
+        yield _user_op(user)
+    for post in posts:
+        yield _post_op(post)
+
+def enable_persistence(data_dir: str, **options) -> PersistenceEngine:
+    """启用持久化：回放已有数据，之后的写操作都会记录日志"""
+    global journal
+    engine = PersistenceEngine(data_dir, apply=apply_op, dump=dump_ops, **options)
+    engine.open()
+    journal = engine
+    return engine
+
+def disable_persistence() -> None:
+    """关闭持久化引擎，剩余日志写入磁盘"""
+    global journal
+    if journal is not None:
+        journal.close()
+        journal = None
 
 # ===== 用户相关业务逻辑 =====
 
-def create_user(user_data: UserRegister) -> dict:
+def create_user(user_data: UserRegister) -> UserRecord:
     """创建用户"""
-    # 检查用户名唯一性
-    for user in users_db.values():
-        if user["username"] == user_data.username:
+    with _locked(("username", user_data.username), ("email", user_data.email)):
+        # 检查用户名唯一性
+        if user_data.username in username_index:
             raise ValueError("用户名已被占用")
-    
-    # 检查邮箱唯一性
-    for user in users_db.values():
-        if user["email"] == user_data.email:
+        
+        # 检查邮箱唯一性
+        if user_data.email in email_index:
             raise ValueError("邮箱已被注册")
-    
-    user_id = get_next_user_id()
-    user = {
-        "id": user_id,
-        "username": user_data.username,
-        "email": user_data.email,
-        "password": user_data.password,  # 实际项目中需要加密
-        "created_at": datetime.now()
-    }
-    
-    users_db[user_id] = user
+        
+        user_id = get_next_user_id()
+        user = UserRecord(
+            id=user_id,
+            username=user_data.username,
+            email=user_data.email,
+            password=user_data.password,  # 实际项目中需要加密
+            created_at=datetime.now()
+        )
+        
+        _put_user(user)
+        _log(_user_op(user))
     return user
 
-def authenticate_user(username: str, password: str) -> Optional[dict]:
-    """用户认证"""
-    for user in users_db.values():
-        if (user["username"] == username or user["email"] == username) and user["password"] == password:
-            return user
+def authenticate_user(username: str, password: str) -> Optional[UserRecord]:
+    """用户认证（支持用户名或邮箱）"""
+    for index in (username_index, email_index):
+        user_id = index.get(username)
+        if user_id is not None:
+            user = users_db.get(user_id)
+            if user is not None and user.password == password:
+                return user
     return None
 
-def get_user_by_id(user_id: int) -> Optional[dict]:
+def get_user_by_id(user_id: int) -> Optional[UserRecord]:
     """根据ID获取用户"""
     return users_db.get(user_id)
 
-def create_post(post_data: PostCreate, author_id: int) -> dict:
+def update_user(user_id: int, username: Optional[str] = None, email: Optional[str] = None) -> Optional[UserRecord]:
+    """更新用户名/邮箱，同步维护索引"""
+    while True:
+        user = users_db.get(user_id)
+        if not user:
+            return None
+        keys = [("user", user_id), ("username", user.username), ("email", user.email)]
+        if username is not None:
+            keys.append(("username", username))
+        if email is not None:
+            keys.append(("email", email))
+        
+        with _locked(*keys):
+            # 加锁前用户名/邮箱可能被其他线程改掉，锁的不是当前的值就重试
+            if users_db.get(user_id) is not user:
+                continue
+            
+            if username is not None and username != user.username:
+                if username in username_index:
+                    raise ValueError("用户名已被占用")
+            if email is not None and email != user.email:
+                if email in email_index:
+                    raise ValueError("邮箱已被注册")
+            
+            # 写入新记录而不是原地修改，读者不会看到改了一半的数据
+            user = UserRecord(
+                id=user_id,
+                username=username if username is not None else user.username,
+                email=email if email is not None else user.email,
+                password=user.password,
+                created_at=user.created_at
+            )
+            _put_user(user)
+            _log(_user_op(user))
+            return user
+
+def delete_user(user_id: int) -> bool:
+    """删除用户及其文章，同步维护索引"""
+    while True:
+        user = users_db.get(user_id)
+        if not user:
+            return False
+        
+        with _locked(("user", user_id), ("username", user.username), ("email", user.email)):
+            if users_db.get(user_id) is not user:
+                continue
+            _remove_user(user_id)
+            _log(("del_user", user_id))
+            return True
+
+def create_post(post_data: PostCreate, author_id: int) -> PostRecord:
     """创建文章"""
-    if author_id not in users_db:
-        raise ValueError("用户不存在")
-    
-    post_id = get_next_post_id()
-    post = {
-        "id": post_id,
-        "title": post_data.title,
-        "content": post_data.content,
-        "author_id": author_id,
-        "author_name": users_db[author_id]["username"],
-        "created_at": datetime.now(),
-        "updated_at": datetime.now()
-    }
-    
-    posts_db[post_id] = post
+    # 持有作者锁，避免与删除该作者并发时留下没有作者的文章
+    with _locked(("user", author_id)):
+        if author_id not in users_db:
+            raise ValueError("用户不存在")
+        
+        post_id = get_next_post_id()
+        now = datetime.now()  # 创建时间和更新时间共用一个对象
+        post = PostRecord(
+            id=post_id,
+            title=post_data.title,
+            content=post_data.content,
+            author_id=author_id,
+            created_at=now,
+            updated_at=now
+        )
+        
+        _put_post(post)
+        _log(_post_op(post))
     return post
 
-def get_post_by_id(post_id: int) -> Optional[dict]:
+def get_post_by_id(post_id: int) -> Optional[PostRecord]:
     """根据ID获取文章"""
     return posts_db.get(post_id)
 
-def get_all_posts() -> list:
+def get_all_posts() -> List[PostRecord]:
     """获取所有文章"""
     return list(posts_db.values())
 
-def update_post(post_id: int, title: str, content: str) -> Optional[dict]:
+def _page(order: List[Tuple[datetime, int]], skip: int, limit: int) -> List[PostRecord]:
+    """从有序索引尾部取一页（最新的在前），只复制这一页"""
+    end = len(order) - skip
+    if end <= 0:
+        return []
+    start = max(end - limit, 0)
+    # 切片在持有GIL时一次完成；取记录时文章可能刚被其他线程删除，跳过即可
+    posts = (posts_db.get(post_id) for _, post_id in reversed(order[start:end]))
+    return [post for post in posts if post is not None]
+
+def get_posts(skip: int = 0, limit: int = 100) -> List[PostRecord]:
+    """分页获取文章（按创建时间倒序）"""
+    return _page(post_order, skip, limit)
+
+def get_posts_by_author(author_id: int, skip: int = 0, limit: int = 100) -> List[PostRecord]:
+    """分页获取指定作者的文章（按创建时间倒序）"""
+    return _page(author_post_order.get(author_id, []), skip, limit)
+
+def update_post(post_id: int, title: str, content: str) -> Optional[PostRecord]:
     """更新文章"""
-    if post_id not in posts_db:
+    post = posts_db.get(post_id)
+    if post is None:
         return None
     
-    post = posts_db[post_id]
-    post.update({
-        "title": title,
-        "content": content,
-        "updated_at": datetime.now()
-    })
+    with _locked(("user", post.author_id)):
+        if post_id not in posts_db:
+            return None
+        post = posts_db[post_id]
+        # 写入新记录而不是原地修改，读者不会看到改了一半的文章
+        post = PostRecord(
+            id=post_id,
+            title=title,
+            content=content,
+            author_id=post.author_id,
+            created_at=post.created_at,
+            updated_at=datetime.now()
+        )
+        _put_post(post)
+        _log(_post_op(post))
     
     return post
 
 def delete_post(post_id: int) -> bool:
     """删除文章"""
-    if post_id not in posts_db:
+    post = posts_db.get(post_id)
+    if post is None:
         return False
     
-    del posts_db[post_id]
-    return True
\ No newline at end of file
+    with _locked(("user", post.author_id)):
+        if _remove_post(post_id) is None:
+            return False
+        _log(("del_post", post_id))
+    return True
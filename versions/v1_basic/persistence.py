@@ -0,0 +1,277 @@
+# v1_basic/persistence.py
+"""
+内存存储的持久化引擎（可选）
+追加写操作日志 + 定期快照，重启时回放恢复数据
+
+目录结构：
+- snapshot.jsonl：快照，每行一帧（JSON），第一帧是快照头（覆盖到的日志段号），
+  之后每帧是最多 SNAPSHOT_FRAME_SIZE 个操作的列表。
+  和日志一样用JSON而不是marshal/pickle：格式不随Python版本变化，升级Python后旧快照仍能读取
+- oplog.00000001.jsonl：操作日志段，每行一个操作（JSON数组）
+
+操作是 ["类型", 字段...] 形式的列表，每个操作都是整条记录的upsert或按ID删除，
+回放是幂等的，所以快照和日志有重叠时重复回放也不会出错。
+"""
+
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "snapshot.jsonl"
+SEGMENT_PREFIX = "oplog."
+SEGMENT_SUFFIX = ".jsonl"
+SNAPSHOT_FRAME_SIZE = 10_000  # 每帧包含的操作数
+
+
+def _segment_name(seq: int) -> str:
+    return f"{SEGMENT_PREFIX}{seq:08d}{SEGMENT_SUFFIX}"
+
+
+def _read_log(path: str) -> Iterator[list]:
+    """用mmap只读映射日志段，逐行解析
+
+    进程崩溃时最后一行可能只写了一半，忽略无法解析的末尾行
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            line = mm.readline()
+            while line:
+                next_line = mm.readline()
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    if next_line or line.endswith(b"\n"):
+                        raise
+                line = next_line
+
+
+def _read_snapshot(path: str) -> Iterator:
+    """用mmap只读映射快照，逐帧解码（第一帧是快照头）
+
+    快照先写临时文件再rename，不会有写了一半的帧，任何解析错误都直接抛出
+    """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b""):
+                yield json.loads(line)
+
+
+class PersistenceEngine:
+    """追加日志 + 快照持久化
+
+    - append()：写入缓冲区后立即返回，后台线程按批次 flush + fsync
+      （崩溃时最多丢失 fsync_interval 秒内的写入）
+    - 后台线程每 snapshot_interval 秒检查一次，写入过 snapshot_min_ops 条操作就生成新快照，
+      快照完成后删除已被覆盖的旧日志段
+    - open()：回放快照和日志，然后开始写新的日志段
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        apply: Callable[[Sequence], None],
+        dump: Callable[[], Iterable[Sequence]],
+        fsync_interval: float = 0.05,
+        fsync_batch: int = 512,
+        snapshot_interval: float = 60.0,
+        snapshot_min_ops: int = 10_000,
+    ):
+        self.data_dir = data_dir
+        self._apply = apply
+        self._dump = dump
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_min_ops = snapshot_min_ops
+
+        self._lock = threading.Lock()         # 保护当前日志文件的写入
+        self._sync_lock = threading.Lock()    # fsync与日志段切换互斥
+        self._wakeup = threading.Condition(self._lock)
+        self._file = None
+        self._segment = 0
+        self._pending = 0                     # 尚未fsync的操作数
+        self._ops_since_snapshot = 0
+        self._closed = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.stats = {"appended": 0, "fsyncs": 0, "snapshots": 0, "replayed": 0, "errors": 0}
+
+    # ===== 启动与关闭 =====
+
+    def open(self) -> None:
+        """回放已有数据并启动后台线程"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        start = time.perf_counter()
+
+        first_segment = 0
+        snapshot_path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            frames = _read_snapshot(snapshot_path)
+            first_segment = next(frames)["segment"]
+            for frame in frames:
+                for op in frame:
+                    self._apply(op)
+                self.stats["replayed"] += len(frame)
+
+        segments = self._list_segments()
+        for seq in segments:
+            if seq < first_segment:
+                os.remove(os.path.join(self.data_dir, _segment_name(seq)))
+                continue
+            for op in _read_log(os.path.join(self.data_dir, _segment_name(seq))):
+                self._apply(op)
+                self.stats["replayed"] += 1
+                self._ops_since_snapshot += 1
+
+        self._segment = max(segments + [first_segment - 1, 0]) + 1
+        self._file = open(os.path.join(self.data_dir, _segment_name(self._segment)), "a", encoding="utf-8")
+        self.stats["replay_seconds"] = round(time.perf_counter() - start, 3)
+
+        self._closed.clear()
+        self._threads = [
+            threading.Thread(target=self._flush_loop, name="oplog-fsync", daemon=True),
+            threading.Thread(target=self._snapshot_loop, name="oplog-snapshot", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self) -> None:
+        """停止后台线程，把剩余日志写入磁盘"""
+        if self._file is None:
+            return
+        self._closed.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._sync()
+        with self._sync_lock:
+            self._file.close()
+            self._file = None
+
+    # ===== 写日志 =====
+
+    def append(self, op: Sequence) -> None:
+        """追加一条操作日志（不等待fsync）"""
+        line = json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._wakeup:
+            self._file.write(line)
+            self._pending += 1
+            self._ops_since_snapshot += 1
+            self.stats["appended"] += 1
+            if self._pending >= self.fsync_batch:
+                self._wakeup.notify()
+
+    def _sync(self) -> None:
+        """flush缓冲区并fsync当前日志段（组提交）"""
+        with self._sync_lock:
+            with self._lock:
+                if self._pending == 0 or self._file is None:
+                    return
+                self._file.flush()
+                pending, self._pending = self._pending, 0
+                fd = self._file.fileno()
+            # fsync期间不持有写锁，其他线程可以继续追加
+            try:
+                os.fsync(fd)
+            except OSError:
+                # 这批操作还没落盘，计数还回去，下次再fsync
+                with self._lock:
+                    self._pending += pending
+                raise
+            self.stats["fsyncs"] += 1
+
+    def _flush_loop(self) -> None:
+        while not self._closed.is_set():
+            with self._wakeup:
+                if self._pending < self.fsync_batch:
+                    self._wakeup.wait(self.fsync_interval)
+            try:
+                self._sync()
+            except Exception as e:
+                # 磁盘满、IO错误时线程不能退出，否则之后的写入再也不会fsync
+                self.stats["errors"] += 1
+                logger.error("操作日志fsync失败，稍后重试：%s", e)
+                self._closed.wait(self.fsync_interval)
+
+    # ===== 快照 =====
+
+    def snapshot(self) -> None:
+        """生成快照：先切换到新的日志段，再写出内存数据，最后删除旧日志段"""
+        with self._sync_lock:
+            with self._lock:
+                old_file = self._file
+                old_file.flush()
+                self._pending = 0
+                self._segment += 1
+                covered = self._segment
+                self._file = open(os.path.join(self.data_dir, _segment_name(covered)), "a", encoding="utf-8")
+                self._ops_since_snapshot = 0
+            os.fsync(old_file.fileno())
+            old_file.close()
+
+        # 切换之后才读取内存数据：旧日志段里的操作一定已经反映在内存中，
+        # 切换之后的操作会在新日志段里重放（幂等）
+        tmp_path = os.path.join(self.data_dir, SNAPSHOT_FILE + ".tmp")
+        with open(tmp_path, "wb") as f:
+            self._write_frame(f, {"segment": covered})
+            frame = []
+            for op in self._dump():
+                frame.append(op)
+                if len(frame) >= SNAPSHOT_FRAME_SIZE:
+                    self._write_frame(f, frame)
+                    frame = []
+            if frame:
+                self._write_frame(f, frame)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.data_dir, SNAPSHOT_FILE))
+        self._fsync_dir()
+
+        for seq in self._list_segments():
+            if seq < covered:
+                os.remove(os.path.join(self.data_dir, _segment_name(seq)))
+        self.stats["snapshots"] += 1
+
+    def _snapshot_loop(self) -> None:
+        retry = False
+        while not self._closed.wait(self.snapshot_interval):
+            if retry or self._ops_since_snapshot >= self.snapshot_min_ops:
+                try:
+                    self.snapshot()
+                    retry = False
+                except Exception as e:
+                    # 失败时保留旧快照和全部日志段，数据仍然完整；下一轮重试
+                    retry = True
+                    self.stats["errors"] += 1
+                    logger.error("生成快照失败，稍后重试：%s", e)
+
+    # ===== 工具方法 =====
+
+    @staticmethod
+    def _write_frame(f, payload) -> None:
+        f.write(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode() + b"\n")
+
+    def _list_segments(self) -> List[int]:
+        segments = []
+        for name in os.listdir(self.data_dir):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                segments.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(segments)
+
+    def _fsync_dir(self) -> None:
+        """rename之后fsync目录，确保新文件名落盘"""
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.data_dir, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,183 @@
+# test_models.py
+"""
+v1内存存储的行为测试
+直接调用models中的业务函数，不经过HTTP
+"""
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import models
+from schemas import UserRegister, PostCreate, PostResponse
+
+PASSWORD = "MyPass136!"
+
+
+def register(username: str, email: str = None) -> models.UserRecord:
+    return models.create_user(UserRegister(
+        username=username,
+        email=email or f"{username}@qq.com",
+        password=PASSWORD
+    ))
+
+
+def test_login_by_username_or_email():
+    """登录按用户名或邮箱查索引；改名、删除后索引同步更新"""
+    models.reset_store()
+    nami = register("nami")
+    zoro = register("zoro")
+
+    assert models.authenticate_user("nami", PASSWORD) is nami
+    assert models.authenticate_user("zoro@qq.com", PASSWORD) is zoro
+    assert models.authenticate_user("nami", "wrong-password") is None
+    assert models.authenticate_user("robin", PASSWORD) is None
+    assert models.username_index == {"nami": nami.id, "zoro": zoro.id}
+    assert models.email_index == {"nami@qq.com": nami.id, "zoro@qq.com": zoro.id}
+
+    for username, email in (("zoro", "new@qq.com"), ("new", "zoro@qq.com")):
+        try:
+            register(username, email)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("重复的用户名/邮箱应该被拒绝")
+    assert len(models.users_db) == 2 and len(models.username_index) == 2
+
+    # 改名后旧用户名、旧邮箱不能再登录
+    renamed = models.update_user(nami.id, username="nami2", email="nami2@qq.com")
+    assert models.authenticate_user("nami", PASSWORD) is None
+    assert models.authenticate_user("nami@qq.com", PASSWORD) is None
+    assert models.authenticate_user("nami2@qq.com", PASSWORD) is renamed
+    assert models.username_index == {"nami2": nami.id, "zoro": zoro.id}
+
+    # 旧用户名释放后可以被别人注册
+    assert register("nami").id == 3
+
+    assert models.delete_user(zoro.id)
+    assert models.authenticate_user("zoro", PASSWORD) is None
+    assert "zoro" not in models.username_index and "zoro@qq.com" not in models.email_index
+
+
+def test_records_read_like_dicts():
+    """记录支持dict风格读取；作者名从用户表读取，作者改名/删除后不会出错"""
+    models.reset_store()
+    nami = register("nami")
+    post = models.create_post(PostCreate(title="第一篇文章", content="这是第一篇文章的内容。"), nami.id)
+
+    assert post["id"] == post.id == 1
+    assert post.get("missing") is None
+    assert post.to_dict()["author_name"] == "nami"
+    assert set(post.keys()) == {"id", "title", "content", "author_id", "created_at", "updated_at", "author_name"}
+    try:
+        post["password"]
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("不存在的字段应该抛出KeyError")
+
+    models.update_user(nami.id, username="nami2")
+    assert post["author_name"] == "nami2"
+
+    # 其他线程已经取到文章对象时作者被删除：读取作者名不能抛出KeyError
+    assert models.delete_user(nami.id)
+    assert post["author_name"] == models.DELETED_AUTHOR_NAME
+    assert PostResponse(**post).id == post.id
+    assert models.get_post_by_id(post.id) is None and not models.post_order
+
+
+
+def test_pagination_bounds():
+    """分页按创建时间倒序；skip/limit 越界时返回空列表或剩余部分"""
+    models.reset_store()
+    nami, zoro = register("nami"), register("zoro")
+    posts = [
+        models.create_post(PostCreate(title=f"文章标题{i}", content=f"这是第{i}篇文章的内容"),
+                           nami.id if i % 3 else zoro.id)
+        for i in range(10)
+    ]
+    newest_first = [post.id for post in reversed(posts)]
+
+    def ids(page):
+        return [post.id for post in page]
+
+    assert ids(models.get_posts()) == newest_first
+    assert ids(models.get_posts(skip=0, limit=3)) == newest_first[:3]
+    assert ids(models.get_posts(skip=3, limit=3)) == newest_first[3:6]
+    assert ids(models.get_posts(skip=8, limit=5)) == newest_first[8:]
+    assert models.get_posts(skip=10, limit=5) == []
+    assert models.get_posts(skip=100, limit=5) == []
+    assert models.get_posts(skip=0, limit=0) == []
+
+    zoro_posts = [post.id for post in reversed(posts) if post.author_id == zoro.id]
+    assert ids(models.get_posts_by_author(zoro.id)) == zoro_posts
+    assert ids(models.get_posts_by_author(zoro.id, skip=1, limit=2)) == zoro_posts[1:3]
+    assert models.get_posts_by_author(zoro.id, skip=len(zoro_posts)) == []
+    assert models.get_posts_by_author(999) == []
+
+    # 更新不改变顺序，删除后分页跳过被删的文章
+    models.update_post(posts[0].id, "修改后的标题", "修改后的文章内容")
+    models.delete_post(posts[5].id)
+    newest_first.remove(posts[5].id)
+    assert ids(models.get_posts(limit=100)) == newest_first
+    assert ids(models.get_posts(skip=8, limit=5)) == newest_first[8:]
+
+
+
+def check_consistency() -> None:
+    """数据与各个索引一致"""
+    assert models.username_index == {user.username: user_id for user_id, user in models.users_db.items()}
+    assert models.email_index == {user.email: user_id for user_id, user in models.users_db.items()}
+    assert models.post_order == sorted((post.created_at, post.id) for post in models.posts_db.values())
+    for author_id, order in models.author_post_order.items():
+        assert order and order == sorted(order)
+        assert all(models.posts_db[post_id].author_id == author_id for _, post_id in order)
+    assert sum(len(order) for order in models.author_post_order.values()) == len(models.posts_db)
+    # 没有作者已被删除的文章
+    assert all(post.author_id in models.users_db for post in models.posts_db.values())
+
+
+def test_concurrent_writes_keep_indexes_consistent():
+    """多线程并发增删改（包括删除作者、改名）之后索引与数据一致，ID不重复"""
+    def worker(seed: int) -> int:
+        rng = random.Random(seed)
+        user = register(f"worker{seed}")
+        created = 0
+        for i in range(400):
+            roll = rng.random()
+            mine = models.get_posts_by_author(user.id, limit=5)
+            if roll < 0.5 or not mine:
+                models.create_post(PostCreate(title=f"文章标题{i}", content=f"这是第{i}篇文章的内容"), user.id)
+                created += 1
+            elif roll < 0.75:
+                models.update_post(rng.choice(mine).id, f"新标题{i}", "修改后的文章内容")
+            elif roll < 0.95:
+                models.delete_post(rng.choice(mine).id)
+            else:
+                models.update_user(user.id, username=f"worker{seed}-{i}")
+            # 读者同时读取其他人的文章
+            for post in models.get_posts(limit=5):
+                PostResponse(**post)
+        if seed % 4 == 0:
+            assert models.delete_user(user.id)
+        return created
+
+    models.reset_store()
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # 更频繁地切换线程，放大竞争
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            created = sum(pool.map(worker, range(16)))
+    finally:
+        sys.setswitchinterval(interval)
+
+    check_consistency()
+    assert len(models.users_db) == 12
+    assert models.post_ids.last == created  # 每次创建分配一个新ID，没有重复
+    assert max(models.posts_db, default=0) <= created
+
+
+if __name__ == "__main__":
+    test_login_by_username_or_email()
+    test_records_read_like_dicts()
+    test_pagination_bounds()
+    test_concurrent_writes_keep_indexes_consistent()
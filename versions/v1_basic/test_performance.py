@@ -0,0 +1,166 @@
+# test_performance.py
+"""
+v1内存存储性能测试
+直接调用models中的业务函数，不经过HTTP
+"""
+import random
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import models
+
+
+def fill_users(count: int) -> None:
+    """批量创建用户（跳过Pydantic校验，只测存储层）"""
+    models.reset_store()
+    for i in range(count):
+        models.create_user(SimpleNamespace(
+            username=f"user{i}",
+            email=f"user{i}@qq.com",
+            password="MyPass136!"
+        ))
+
+
+def login_benchmark(sizes=(1_000, 10_000, 100_000, 1_000_000), logins: int = 10_000) -> None:
+    """不同用户规模下的登录耗时：索引查找应保持平稳"""
+    print("登录耗时（用户名/邮箱各一半）")
+    for size in sizes:
+        fill_users(size)
+        accounts = []
+        for _ in range(logins):
+            i = random.randrange(size)
+            accounts.append(f"user{i}" if i % 2 else f"user{i}@qq.com")
+
+        start = time.perf_counter()
+        for account in accounts:
+            assert models.authenticate_user(account, "MyPass136!")
+        elapsed = time.perf_counter() - start
+        print(f"  {size:>9,} 用户: {elapsed / logins * 1e6:.2f} 微秒/次")
+
+
+def memory_benchmark(count: int = 1_000_000) -> None:
+    """每100万篇文章占用的内存"""
+    fill_users(1)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        models.create_post(SimpleNamespace(
+            title=f"文章标题{i}",
+            content=f"文章内容{i}"
+        ), 1)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"{count:,} 篇文章: {used / 1024 / 1024:.1f} MB，平均 {used / count:.0f} 字节/篇")
+
+
+def listing_benchmark(count: int = 1_000_000, pages: int = 1_000) -> None:
+    """分页列表：只取一页，耗时与文章总数无关"""
+    fill_users(10)
+    for i in range(count):
+        models.create_post(SimpleNamespace(
+            title=f"文章标题{i}",
+            content=f"文章内容{i}"
+        ), i % 10 + 1)
+
+    start = time.perf_counter()
+    for page in range(pages):
+        models.get_posts(skip=page * 20, limit=20)
+    page_elapsed = (time.perf_counter() - start) / pages
+
+    start = time.perf_counter()
+    for page in range(pages):
+        models.get_posts_by_author(3, skip=page * 20, limit=20)
+    author_elapsed = (time.perf_counter() - start) / pages
+
+    start = time.perf_counter()
+    models.get_all_posts()
+    full_elapsed = time.perf_counter() - start
+
+    print(f"{count:,} 篇文章：分页 {page_elapsed * 1e6:.1f} 微秒/页，"
+          f"作者分页 {author_elapsed * 1e6:.1f} 微秒/页，全量复制 {full_elapsed * 1e3:.1f} 毫秒")
+
+
+def _mixed_workload(worker: int, ops: int) -> None:
+    """单个线程的混合读写：注册、登录、发文、读文、改文、删文"""
+    rng = random.Random(worker)
+    user = models.create_user(SimpleNamespace(
+        username=f"worker{worker}", email=f"worker{worker}@qq.com", password="MyPass136!"
+    ))
+    for i in range(ops):
+        roll = rng.random()
+        if roll < 0.3:
+            models.create_post(SimpleNamespace(title=f"标题{i}", content="内容"), user.id)
+        elif roll < 0.6:
+            models.get_post_by_id(rng.randrange(1, models.post_ids.last + 2))
+        elif roll < 0.75:
+            models.get_posts(limit=20)
+        elif roll < 0.85:
+            models.authenticate_user(f"worker{rng.randrange(worker + 1)}", "MyPass136!")
+        elif roll < 0.95:
+            posts = models.get_posts_by_author(user.id, limit=1)
+            if posts:
+                models.update_post(posts[0].id, "新标题", "新内容")
+        else:
+            posts = models.get_posts_by_author(user.id, limit=1)
+            if posts:
+                models.delete_post(posts[0].id)
+
+
+def concurrency_benchmark(thread_counts=(1, 2, 4, 8, 16), ops_per_task: int = 20_000, tasks: int = 16) -> None:
+    """多线程压测：模拟FastAPI线程池并发执行同步接口，并检查索引一致性"""
+    print("线程池压测（混合读写）")
+    for threads in thread_counts:
+        models.reset_store()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(_mixed_workload, range(tasks), [ops_per_task] * tasks))
+        elapsed = time.perf_counter() - start
+
+        # 一致性检查：ID不重复、索引与数据一致
+        assert len(models.users_db) == tasks
+        assert len(models.post_order) == len(models.posts_db)
+        assert sum(len(order) for order in models.author_post_order.values()) == len(models.posts_db)
+        assert {post_id for _, post_id in models.post_order} == set(models.posts_db)
+        print(f"  {threads:>2} 线程: {tasks * ops_per_task / elapsed:,.0f} 次/秒")
+
+
+def persistence_benchmark(count: int = 1_000_000) -> None:
+    """持久化：写入吞吐、快照耗时、重启回放耗时"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        models.reset_store()
+        models.enable_persistence(data_dir)
+        author = models.create_user(SimpleNamespace(
+            username="author", email="author@qq.com", password="MyPass136!"
+        ))
+
+        start = time.perf_counter()
+        for i in range(count):
+            models.create_post(SimpleNamespace(
+                title=f"文章标题{i}",
+                content=f"文章内容{i}"
+            ), author.id)
+        write_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        models.journal.snapshot()
+        snapshot_elapsed = time.perf_counter() - start
+        models.disable_persistence()
+
+        models.reset_store()
+        engine = models.enable_persistence(data_dir)
+        assert len(models.posts_db) == count
+        models.disable_persistence()
+
+        print(f"持久化 {count:,} 篇文章：写入 {count / write_elapsed:,.0f} 次/秒，"
+              f"快照 {snapshot_elapsed:.2f} 秒，回放 {engine.stats['replay_seconds']:.2f} 秒")
+
+
+if __name__ == "__main__":
+    login_benchmark()
+    memory_benchmark()
+    listing_benchmark()
+    concurrency_benchmark()
+    persistence_benchmark()
@@ -0,0 +1,159 @@
+# test_persistence.py
+"""
+v1持久化测试：日志回放、快照、崩溃后的半行日志、后台线程的错误恢复
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+import models
+import persistence
+from schemas import UserRegister, PostCreate
+
+PASSWORD = "MyPass136!"
+
+
+def register(username: str) -> models.UserRecord:
+    return models.create_user(UserRegister(username=username, email=f"{username}@qq.com", password=PASSWORD))
+
+
+def write_post(author_id: int, i: int) -> models.PostRecord:
+    return models.create_post(PostCreate(title=f"文章标题{i}", content=f"这是第{i}篇文章的内容"), author_id)
+
+
+def restart(data_dir: str) -> persistence.PersistenceEngine:
+    """模拟重启：关闭持久化，清空内存，重新回放"""
+    models.disable_persistence()
+    models.reset_store()
+    return models.enable_persistence(data_dir, snapshot_interval=3600)
+
+
+def state() -> tuple:
+    """内存中的全部数据和索引，用于比较回放前后是否一致"""
+    return (
+        {user_id: user.to_dict() for user_id, user in models.users_db.items()},
+        {post_id: post.to_dict() for post_id, post in models.posts_db.items()},
+        dict(models.username_index),
+        dict(models.email_index),
+        list(models.post_order),
+        {author_id: list(order) for author_id, order in models.author_post_order.items()},
+    )
+
+
+def test_replay_snapshot_and_log():
+    """快照之后的修改、删除记录在日志里，重启后先回放快照再回放日志"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        models.reset_store()
+        models.enable_persistence(data_dir, snapshot_interval=3600)
+        try:
+            nami, zoro = register("nami"), register("zoro")
+            posts = [write_post(zoro.id if i % 2 else nami.id, i) for i in range(10)]
+            models.journal.snapshot()
+            # 快照是JSON：格式不随Python版本变化
+            with open(os.path.join(data_dir, persistence.SNAPSHOT_FILE), encoding="utf-8") as f:
+                assert "segment" in json.loads(f.readline())
+                assert all(isinstance(json.loads(line), list) for line in f)
+
+            models.update_post(posts[0].id, "修改后的标题", "修改后的文章内容")
+            models.delete_post(posts[1].id)
+            models.update_user(nami.id, username="nami2")
+            models.delete_user(zoro.id)
+            write_post(nami.id, 10)
+            expected = state()
+
+            engine = restart(data_dir)
+            assert state() == expected
+            assert engine.stats["replayed"] > 0
+            assert models.authenticate_user("nami2", PASSWORD).id == nami.id
+            assert models.get_post_by_id(posts[0].id).title == "修改后的标题"
+            assert models.get_post_by_id(posts[1].id) is None
+
+            # 再快照一次：旧日志段被删除，重启结果不变
+            models.journal.snapshot()
+            engine = restart(data_dir)
+            assert state() == expected
+        finally:
+            models.disable_persistence()
+
+
+def test_torn_tail_ignored():
+    """进程崩溃时日志最后一行只写了一半：忽略这一行，前面的数据完整恢复"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        models.reset_store()
+        models.enable_persistence(data_dir, snapshot_interval=3600)
+        try:
+            author = register("nami")
+            for i in range(5):
+                write_post(author.id, i)
+            expected = state()
+            models.disable_persistence()
+
+            segment = max(name for name in os.listdir(data_dir) if name.startswith(persistence.SEGMENT_PREFIX))
+            with open(os.path.join(data_dir, segment), "a", encoding="utf-8") as f:
+                f.write('["post",6,"写了一半')
+
+            restart(data_dir)
+            assert state() == expected
+        finally:
+            models.disable_persistence()
+
+
+def test_ids_not_reused_after_restart():
+    """删除最大ID的数据后重启，新数据的ID仍然递增（日志回放和快照两种情况）"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        models.reset_store()
+        models.enable_persistence(data_dir, snapshot_interval=3600)
+        try:
+            author = register("nami")
+            posts = [write_post(author.id, i) for i in range(3)]
+            assert models.delete_post(posts[-1].id)
+            doomed = register("zoro")
+            assert models.delete_user(doomed.id)
+
+            restart(data_dir)
+            assert write_post(author.id, 3).id == 4
+            assert register("robin").id == 3
+
+            assert models.delete_post(4)
+            models.journal.snapshot()
+            restart(data_dir)
+            assert write_post(author.id, 4).id == 5
+        finally:
+            models.disable_persistence()
+
+
+def test_flush_thread_survives_fsync_error():
+    """fsync失败（磁盘满、IO错误）时后台线程记录错误并在下一轮重试，不会退出"""
+    real_fsync = os.fsync
+    failures = [2]
+
+    def flaky_fsync(fd):
+        if failures[0] > 0:
+            failures[0] -= 1
+            raise OSError(28, "No space left on device")
+        real_fsync(fd)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        models.reset_store()
+        engine = models.enable_persistence(data_dir, fsync_interval=0.01, snapshot_interval=3600)
+        os.fsync = flaky_fsync
+        try:
+            register("nami")
+            deadline = time.monotonic() + 5
+            while engine.stats["fsyncs"] == 0:
+                assert time.monotonic() < deadline, "fsync没有重试"
+                time.sleep(0.01)
+            assert engine.stats["errors"] == 2
+            assert any(thread.name == "oplog-fsync" and thread.is_alive() for thread in threading.enumerate())
+        finally:
+            os.fsync = real_fsync
+            models.disable_persistence()
+
+
+if __name__ == "__main__":
+    test_replay_snapshot_and_log()
+    test_torn_tail_ignored()
+    test_ids_not_reused_after_restart()
+    test_flush_thread_survives_fsync_error()
@@ -0,0 +1,119 @@
+# v7_jwt/admission.py
+"""
+准入控制（过载保护）
+限制同时处理的请求数，超出的请求按优先级排队；
+队列已满或排队超时的请求直接返回503，而不是都挤在数据库锁后面等到客户端超时
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+from typing import List, Tuple
+
+# 同时处理的请求数
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "64"))
+# 最多排队的请求数
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "256"))
+# 排队超过这个时间（秒）就放弃
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+
+# 优先级：数字越小越优先
+PRIORITY_HEALTH = 0
+PRIORITY_AUTH = 1
+PRIORITY_DEFAULT = 2
+PRIORITY_SEARCH = 3
+
+
+class AdmissionController:
+    """带优先级等待队列的并发限制器
+
+    - acquire()：有空位直接进入；否则排队，按优先级（同优先级先来先服务）获得空位
+    - 队列满时：新请求优先级更高就挤掉队列里优先级最低的请求，否则新请求被拒绝
+    - 排队超过 queue_timeout 秒的请求被拒绝
+    - release()：请求结束时把空位直接交给队首请求
+    只在事件循环线程中使用，不需要加锁
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+                 max_queue: int = MAX_QUEUED_REQUESTS,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiting = 0
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.stats = {"admitted": 0, "queued": 0, "max_queue_depth": 0, "shed": 0, "timeouts": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def metrics(self) -> dict:
+        return dict(self.stats, in_flight=self.in_flight, queue_depth=self._waiting,
+                    max_concurrent=self.max_concurrent, max_queue=self.max_queue)
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT) -> bool:
+        """获取处理名额，返回False表示请求被拒绝"""
+        if self.in_flight < self.max_concurrent and not self._waiting:
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            return True
+
+        if self._waiting >= self.max_queue and not self._evict_lower_than(priority):
+            self.stats["shed"] += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self._waiting += 1
+        self.stats["queued"] += 1
+        if self._waiting > self.stats["max_queue_depth"]:
+            self.stats["max_queue_depth"] = self._waiting
+
+        try:
+            # 用wait而不是wait_for：超时不会取消future，下面可以区分"刚好拿到名额"和"超时"
+            await asyncio.wait({future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # 客户端断开：已经拿到的名额要还回去
+            if future.done() and not future.cancelled() and future.result():
+                self.release()
+            elif not future.done():
+                future.cancel()
+                self._waiting -= 1
+            raise
+
+        if future.done():
+            # True：release()交来的名额；False：被优先级更高的请求挤出队列
+            return future.result()
+        future.cancel()
+        self._waiting -= 1
+        self.stats["timeouts"] += 1
+        return False
+
+    def release(self) -> None:
+        """请求处理结束：名额交给队列中优先级最高的请求"""
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue  # 已超时、已取消或已被挤出
+            self._waiting -= 1
+            self.stats["admitted"] += 1
+            future.set_result(True)
+            return
+        self.in_flight -= 1
+
+    def _evict_lower_than(self, priority: int) -> bool:
+        """队列已满时挤掉一个优先级比priority低的排队请求（队列有上限，线性查找即可）"""
+        worst = None
+        for entry in self._queue:
+            if not entry[2].done() and entry[0] > priority and (worst is None or entry[:2] > worst[:2]):
+                worst = entry
+        if worst is None:
+            return False
+        worst[2].set_result(False)
+        self._waiting -= 1
+        self.stats["shed"] += 1
+        return True
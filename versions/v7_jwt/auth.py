@@ -1,29 +1,75 @@
-from datetime import datetime, timedelta
+import hashlib
+import os
+import secrets
+import time
+from datetime import timedelta
 from typing import Optional
-from jose import JWTError, jwt
 from fastapi import HTTPException, status
 
+from jwt_codec import KeyRing, InvalidTokenError, load_key_ring, DEFAULT_KID
+
 
 
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# 刷新令牌：每次刷新有效期顺延 REFRESH_TOKEN_EXPIRE_DAYS 天，但不超过登录后 REFRESH_TOKEN_MAX_DAYS 天
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+REFRESH_TOKEN_MAX_DAYS = int(os.getenv("REFRESH_TOKEN_MAX_DAYS", "30"))
+# 刷新令牌被轮换后的宽限期（秒）：期间再次使用视为并发刷新（多个标签页、超时重试），不按重放处理
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_TOKEN_REUSE_GRACE_SECONDS", "10"))
+# 是否在token中携带用户资料（用户名、邮箱、注册时间），携带时获取资料无需查询数据库
+TOKEN_PROFILE_CLAIMS = os.getenv("TOKEN_PROFILE_CLAIMS", "true").lower() == "true"
+
+# 签名密钥环：配置了 JWT_KEYS_FILE 时从文件加载（支持kid和密钥轮换），
+# 否则只有一个使用 SECRET_KEY 的密钥
+JWT_KEYS_FILE = os.getenv("JWT_KEYS_FILE")
+if JWT_KEYS_FILE:
+    _codec = load_key_ring(JWT_KEYS_FILE)
+else:
+    _codec = KeyRing({DEFAULT_KID: SECRET_KEY}, active_kid=DEFAULT_KID)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     
     to_encode = data.copy()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = int(time.time() + expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # jti：token的唯一标识，注销时按它加入撤销列表
+    to_encode.setdefault("jti", secrets.token_urlsafe(16))
+    encoded_jwt = _codec.encode(to_encode)
     return encoded_jwt
 
+def create_user_access_token(user, expires_delta: Optional[timedelta] = None, session_id: Optional[str] = None) -> str:
+    """为用户签发token
+
+    - ver：用户的token版本，用户资料变化或注销时加1，旧token随之失效
+    - username/email/created_at：可选的资料声明，经过签名，不能被客户端篡改
+    - sid：登录会话（刷新令牌的family），注销时一并作废
+    """
+    claims = {"sub": str(user.id), "ver": user.token_version or 0}
+    if session_id:
+        claims["sid"] = session_id
+    if TOKEN_PROFILE_CLAIMS:
+        claims["username"] = user.username
+        claims["email"] = user.email
+        claims["created_at"] = user.created_at.isoformat() if user.created_at else None
+    return create_access_token(claims, expires_delta)
+
+def new_refresh_token() -> str:
+    """生成刷新令牌明文（256位随机数），只返回给客户端一次"""
+    return secrets.token_urlsafe(32)
+
+def hash_refresh_token(token: str) -> str:
+    """刷新令牌本身是高熵随机数，用sha256做摘要即可，不需要慢哈希"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
 def verify_token(token: str) -> dict:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _codec.decode(token)
 
         user_id_str: str = payload.get("sub")
         if user_id_str is None:
@@ -40,8 +86,18 @@ def verify_token(token: str) -> dict:
                 detail="无效的认证凭据",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return {"user_id": user_id}
-    except JWTError:
+        # 没有ver声明的token是加入版本号之前签发的，按版本0处理
+        return {
+            "user_id": user_id,
+            "ver": payload.get("ver", 0),
+            "username": payload.get("username"),
+            "email": payload.get("email"),
+            "created_at": payload.get("created_at"),
+            "jti": payload.get("jti"),
+            "sid": payload.get("sid"),
+            "exp": payload.get("exp"),
+        }
+    except InvalidTokenError:
         raise HTTPException(
             status_code=401,
             detail="无效的认证凭据",
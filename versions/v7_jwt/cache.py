@@ -0,0 +1,157 @@
+# v7_jwt/cache.py
+"""
+读路径缓存工具
+single-flight：同一个key的并发读请求合并为一次查询
+id存在性位图：不存在的id直接返回404，不访问数据库
+TTL缓存：短时间内重复读取的小数据（如用户的token版本）
+"""
+
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class SingleFlight:
+    """并发请求合并（single-flight）
+
+    同一时刻针对同一个key只执行一次加载函数，其余并发调用者等待同一个结果：
+    - 加载成功：所有等待者拿到同一个结果对象
+    - 加载失败：所有等待者收到同一个异常
+    - 超时：等待者各自抛出 asyncio.TimeoutError，加载本身不会因某个调用者取消而中断
+    - 加载不继承领头调用者的 ContextVar（如请求截止时间），需要时由加载函数自己设置
+    """
+
+    def __init__(self, timeout: float = 5.0):
+        self.timeout = timeout
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"calls": 0, "loads": 0, "shared": 0}
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """执行（或加入）key对应的加载任务并等待结果"""
+        self.stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["loads"] += 1
+            # 加载放在独立的Task里，领头请求被取消时其他等待者不受影响；
+            # Task在空的上下文中运行：领头请求快到截止时间时，不能让所有等待者跟着失败
+            task = contextvars.Context().run(asyncio.ensure_future, loader())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+        else:
+            self.stats["shared"] += 1
+
+        # shield：等待者超时/取消只影响自己，不会取消共享的加载任务
+        return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+
+    def forget(self, key: Hashable) -> None:
+        """让后续调用不再加入当前进行中的加载（数据被修改后调用）"""
+        self._inflight.pop(key, None)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 取出异常，避免没有等待者时出现 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+
+class IdPresenceSet:
+    """id存在性位图（负缓存）
+
+    启动时从数据库加载全部id，每个id占1个bit（100万id约125KB）。
+    max_id 表示"不大于它的id是否存在都已知道"：
+    - id不大于 max_id 且对应bit为0：确定不存在，无需查询数据库
+    - id大于 max_id：可能是其他进程新建的数据，照常查询数据库
+    新建或查到的id只记录bit；只有和 max_id 连续时才推进 max_id，
+    否则中间的id（可能由其他进程新建）会被误判为不存在
+
+    前提是id不会被复用：users/posts 表使用 AUTOINCREMENT（PostgreSQL的序列本来就不复用），
+    否则普通 INTEGER PRIMARY KEY 在删除最大id的行后会把 max(id)+1 再分配出去，
+    已知范围内的空洞被其他进程重新使用后会被误判为不存在。
+    删除时不清除bit：已删除的id仍走数据库查询，结果依然正确
+    """
+
+    def __init__(self):
+        self._bits = bytearray()
+        self.max_id = 0
+        self.loaded = False
+        self.stats = {"negative_hits": 0}
+
+    def load(self, ids: Iterable[int]) -> None:
+        """用数据库中的全部id初始化位图"""
+        self._bits = bytearray()
+        max_id = 0
+        for i in ids:
+            self._set(i)
+            max_id = max(max_id, i)
+        # 加载的是数据库的完整快照：最大id以内没有出现的id都确定不存在
+        self.max_id = max_id
+        self.loaded = True
+
+    def add(self, item_id: int) -> None:
+        """记录一个存在的id（新建数据或在数据库中查到时调用）"""
+        if item_id < 1:
+            return
+        self._set(item_id)
+        # 从 max_id+1 开始连续已知存在的id才能并入已知范围
+        while self._has(self.max_id + 1):
+            self.max_id += 1
+
+    def _set(self, item_id: int) -> None:
+        if item_id < 1:
+            return
+        byte_index = item_id >> 3
+        if byte_index >= len(self._bits):
+            # 按倍数扩容，避免连续新建时频繁复制
+            new_size = max(byte_index + 1, len(self._bits) * 2)
+            self._bits.extend(bytes(new_size - len(self._bits)))
+        self._bits[byte_index] |= 1 << (item_id & 7)
+
+    def _has(self, item_id: int) -> bool:
+        byte_index = item_id >> 3
+        return byte_index < len(self._bits) and bool(self._bits[byte_index] & (1 << (item_id & 7)))
+
+    def might_exist(self, item_id: int) -> bool:
+        """返回False表示id一定不存在"""
+        if not self.loaded or item_id > self.max_id:
+            return True
+        if item_id < 1 or not self._has(item_id):
+            self.stats["negative_hits"] += 1
+            return False
+        return True
+
+
+class TTLCache:
+    """带过期时间的进程内缓存
+
+    过期的条目在读取时删除；条目数超过 max_size 时淘汰最早写入的条目。
+    每个worker进程各有一份，其他进程写入的数据最多延迟 ttl 秒可见。
+    """
+
+    def __init__(self, ttl: float, max_size: int = 100_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """返回未过期的值，没有则返回None"""
+        entry = self._data.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.stats["hits"] += 1
+                return entry[1]
+            del self._data[key]
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data.pop(key, None)
+        if len(self._data) >= self.max_size:
+            # dict按插入顺序迭代，第一个就是最早写入的
+            del self._data[next(iter(self._data))]
+        self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
@@ -0,0 +1,53 @@
+# conftest.py
+"""
+测试共用的临时SQLite数据库
+pytest下数据库文件放在 tmp_path 里；直接运行测试脚本时用 temp_database() 创建临时目录，退出时删除
+引擎在测试自己的事件循环中创建，退出 async with 时释放
+"""
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from database import create_tables
+
+
+class TempDatabase:
+    """临时目录下的SQLite数据库文件"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def url(self, name: str = "test.db") -> str:
+        return f"sqlite+aiosqlite:///{self.directory / name}"
+
+    @asynccontextmanager
+    async def engine(self, name: str = "test.db", create: bool = False, **kwargs):
+        """创建引擎（create=True 时建表），退出时释放连接"""
+        engine = create_async_engine(self.url(name), **kwargs)
+        try:
+            if create:
+                await create_tables(engine)
+            yield engine
+        finally:
+            await engine.dispose()
+
+    @asynccontextmanager
+    async def sessions(self, name: str = "test.db", **kwargs):
+        """建好表的引擎和会话工厂"""
+        async with self.engine(name, create=True, **kwargs) as engine:
+            yield engine, async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@contextmanager
+def temp_database():
+    """不经过pytest运行时使用的临时数据库"""
+    with tempfile.TemporaryDirectory() as directory:
+        yield TempDatabase(directory)
+
+
+@pytest.fixture
+def database(tmp_path) -> TempDatabase:
+    return TempDatabase(tmp_path)
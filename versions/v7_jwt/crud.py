@@ -5,34 +5,84 @@
 """
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, desc
-from typing import List, Optional
-import hashlib
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import select, insert, update, delete, or_, desc, bindparam, func
+from typing import List, Optional, Tuple
+import logging
+import secrets
+import time
 
-from models import User, Post
+from models import User, Post, RevokedToken, RefreshToken
+from passwords import hash_password, verify_password, needs_rehash, HashingOverloaded, DUMMY_HASH
+from auth import (
+    new_refresh_token, hash_refresh_token,
+    REFRESH_TOKEN_EXPIRE_DAYS, REFRESH_TOKEN_MAX_DAYS, REFRESH_TOKEN_REUSE_GRACE_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# ===== 预先构建的热点查询 =====
+# 语句只构建一次，参数在执行时用 bindparam 传入：省去每次调用构建 select() 和生成缓存键的开销
+# （缓存键记在语句对象上），编译后的SQL由引擎的编译缓存复用
+
+_user_by_id = select(User).where(User.id == bindparam("user_id"))
+_user_by_username = select(User).where(User.username == bindparam("username"))
+_user_by_email = select(User).where(User.email_lower == bindparam("email_lower"))
+_post_by_id = select(Post).where(Post.id == bindparam("post_id"))
+_posts_page = (
+    select(Post)
+    .order_by(desc(Post.created_at))
+    .offset(bindparam("skip"))
+    .limit(bindparam("limit"))
+)
+_posts_search = (
+    select(Post)
+    .where(or_(Post.title.contains(bindparam("keyword")), Post.content.contains(bindparam("keyword"))))
+    .order_by(desc(Post.created_at))
+    .offset(bindparam("skip"))
+    .limit(bindparam("limit"))
+)
 
 # ===== 异步用户相关操作 =====
 
 async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
     """异步根据ID获取用户"""
-    result = await db.execute(select(User).filter(User.id == user_id))
+    result = await db.execute(_user_by_id, {"user_id": user_id})
     return result.scalar_one_or_none()
 
 async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     """异步根据用户名获取用户"""
-    result = await db.execute(select(User).filter(User.username == username))
+    result = await db.execute(_user_by_username, {"username": username})
     return result.scalar_one_or_none()
 
 async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
-    """异步根据邮箱获取用户"""
-    result = await db.execute(select(User).filter(User.email == email))
+    """异步根据邮箱获取用户（大小写不敏感，走 email_lower 唯一索引）"""
+    result = await db.execute(_user_by_email, {"email_lower": email.lower()})
+    # 旧数据可能有只差大小写的重复邮箱（此时迁移只建了普通索引），取第一条
+    return result.scalars().first()
+
+async def get_token_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    """异步获取用户当前的token版本（用户不存在时返回None）"""
+    result = await db.execute(select(User.token_version).filter(User.id == user_id))
     return result.scalar_one_or_none()
 
+async def bump_token_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    """异步把用户的token版本加1，使该用户已签发的token全部失效，返回新版本"""
+    await db.execute(
+        update(User).where(User.id == user_id).values(token_version=User.token_version + 1)
+    )
+    await db.commit()
+    return await get_token_version(db, user_id)
+
 async def get_user_count(db: AsyncSession) -> int:
-    """异步获取用户总数"""
-    result = await db.execute(select(User))
-    users = result.scalars().all()
-    return len(users)
+    """异步获取用户总数（COUNT查询，不加载用户对象）"""
+    result = await db.execute(select(func.count()).select_from(User))
+    return result.scalar_one()
+
+async def get_all_user_ids(db: AsyncSession) -> List[int]:
+    """异步获取所有用户ID（只查询主键列）"""
+    result = await db.execute(select(User.id))
+    return result.scalars().all()
 
 async def get_all_users(db: AsyncSession) -> List[User]:
     """异步获取所有用户"""
@@ -51,8 +101,8 @@ async def create_user(db: AsyncSession, username: str, email: str, password: str
     if existing_email:
         raise ValueError("邮箱已被注册")
     
-    # 密码哈希
-    hashed_password = hashlib.sha256(password.encode()).hexdigest()
+    # 密码哈希（scrypt，在专用线程池中计算，不阻塞事件循环）
+    hashed_password = await hash_password(password)
     
     db_user = User(
         username=username,
@@ -62,27 +112,40 @@ async def create_user(db: AsyncSession, username: str, email: str, password: str
     
     db.add(db_user)
     await db.commit()
-    await db.refresh(db_user)
     
     return db_user
 
 async def authenticate_user(db: AsyncSession, account: str, password: str) -> Optional[User]:
-    """异步用户认证 - 支持用户名或邮箱登录"""
-    # 支持用户名或邮箱登录
-    result = await db.execute(
-        select(User).filter(
-            or_(User.username == account, User.email == account)
-        )
-    )
-    user = result.scalar_one_or_none()
+    """异步用户认证 - 支持用户名或邮箱登录
+
+    按账号形式只查一个唯一索引，而不是 username OR email：
+    - 包含@：按小写邮箱查询（大小写不敏感）；用户名也可能包含@，查不到时再按用户名查
+    - 其他：按用户名查询
+    账号不存在时同样校验一次密码（DUMMY_HASH），不能通过响应时间判断账号是否存在
+    """
+    user = None
+    if "@" in account:
+        user = await get_user_by_email(db, account)
+    if not user:
+        user = await get_user_by_username(db, account)
     
     if not user:
+        await verify_password(password, DUMMY_HASH)
         return None
     
     # 验证密码
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
-    if user.hashed_password != password_hash:
+    if not await verify_password(password, user.hashed_password):
         return None
+
+    # 旧版sha256密码：登录成功时用明文重新计算scrypt哈希，用户无感知地完成迁移
+    if needs_rehash(user.hashed_password):
+        try:
+            user.hashed_password = await hash_password(password)
+            await db.commit()
+            logger.info(f"用户密码哈希已升级: ID={user.id}")
+        except HashingOverloaded:
+            # 线程池繁忙时跳过，下次登录再升级
+            pass
     
     return user
 
@@ -90,7 +153,7 @@ async def authenticate_user(db: AsyncSession, account: str, password: str) -> Op
 
 async def get_post_by_id(db: AsyncSession, post_id: int) -> Optional[Post]:
     """异步根据ID获取文章"""
-    result = await db.execute(select(Post).filter(Post.id == post_id))
+    result = await db.execute(_post_by_id, {"post_id": post_id})
     return result.scalar_one_or_none()
 
 async def get_posts_by_user(db: AsyncSession, user_id: int) -> List[Post]:
@@ -102,26 +165,23 @@ async def get_posts_by_user(db: AsyncSession, user_id: int) -> List[Post]:
 
 async def get_posts(db: AsyncSession, skip: int = 0, limit: int = 100, keyword: str= None) -> List[Post]:
     """异步获取文章列表（支持分页和搜索）"""
-    query = select(Post)
-
+    params = {"skip": skip, "limit": limit}
     if keyword and keyword.strip():
-        query = query.filter(
-            or_(
-                Post.title.contains(keyword),
-                Post.content.contains(keyword)
-            )
-        )
-    
-    query = query.order_by(desc(Post.created_at)).offset(skip).limit(limit)
-        
-    result = await db.execute(query)
+        params["keyword"] = keyword
+        result = await db.execute(_posts_search, params)
+    else:
+        result = await db.execute(_posts_page, params)
+    return result.scalars().all()
+
+async def get_all_post_ids(db: AsyncSession) -> List[int]:
+    """异步获取所有文章ID（只查询主键列）"""
+    result = await db.execute(select(Post.id))
     return result.scalars().all()
 
 async def get_post_count(db: AsyncSession) -> int:
-    """异步获取文章总数"""
-    result = await db.execute(select(Post))
-    posts = result.scalars().all()
-    return len(posts)
+    """异步获取文章总数（COUNT查询，不加载文章对象）"""
+    result = await db.execute(select(func.count()).select_from(Post))
+    return result.scalar_one()
 
 async def create_post(db: AsyncSession, title: str, content: str, author_id: int) -> Post:
     """异步创建文章"""
@@ -138,10 +198,32 @@ async def create_post(db: AsyncSession, title: str, content: str, author_id: int
     
     db.add(db_post)
     await db.commit()
-    await db.refresh(db_post)
     
     return db_post
 
+async def bulk_create_posts(db: AsyncSession, posts: List[dict]) -> int:
+    """异步批量导入文章，posts 为 {"title", "content", "author_id"} 字典列表，返回导入条数
+
+    - PostgreSQL（asyncpg）：用 COPY 协议（copy_records_to_table）一次传输全部数据，
+      不经过SQL解析和逐行绑定；没有列出的 created_at/updated_at 由列默认值填写
+    - 其他数据库：一条 INSERT 语句批量执行（executemany）
+    不检查作者是否存在，由外键约束保证
+    """
+    if not posts:
+        return 0
+    if db.bind.dialect.driver == "asyncpg":
+        conn = await db.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            Post.__tablename__,
+            records=[(post["title"], post["content"], post["author_id"]) for post in posts],
+            columns=["title", "content", "author_id"]
+        )
+    else:
+        await db.execute(insert(Post), posts)
+    await db.commit()
+    return len(posts)
+
 async def update_post(db: AsyncSession, post_id: int, title: str = None, content: str = None) -> Optional[Post]:
     """异步更新文章"""
     post = await get_post_by_id(db, post_id)
@@ -154,7 +236,6 @@ async def update_post(db: AsyncSession, post_id: int, title: str = None, content
         post.content = content
     
     await db.commit()
-    await db.refresh(post)
     
     return post
 
@@ -167,4 +248,138 @@ async def delete_post(db: AsyncSession, post_id: int) -> bool:
     await db.delete(post)
     await db.commit()
     
-    return True
\ No newline at end of file
+    return True
+
+# ===== 异步token撤销相关操作 =====
+
+async def revoke_token(db: AsyncSession, jti: str, user_id: int, expires_at: int) -> None:
+    """异步记录已注销的token
+
+    重复注销（包括并发的重复注销）由jti唯一约束处理：ON CONFLICT DO NOTHING，
+    不需要先查询，也不会因为唯一约束报错
+    """
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    await db.execute(
+        dialect.insert(RevokedToken)
+        .values(jti=jti, user_id=user_id, expires_at=expires_at, revoked_at=int(time.time()))
+        .on_conflict_do_nothing(index_elements=["jti"])
+    )
+    await db.commit()
+
+async def get_revoked_tokens_since(db: AsyncSession, since: int) -> List[tuple]:
+    """异步获取注销时间不早于since的撤销记录 (revoked_at, jti, expires_at)，用于增量同步"""
+    result = await db.execute(
+        select(RevokedToken.revoked_at, RevokedToken.jti, RevokedToken.expires_at)
+        .filter(RevokedToken.revoked_at >= since)
+        .order_by(RevokedToken.revoked_at)
+    )
+    return [tuple(row) for row in result.all()]
+
+async def delete_expired_revocations(db: AsyncSession, now: int) -> int:
+    """异步删除已过期token的撤销记录（过期的token本身就无法通过验证）"""
+    result = await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+    await db.commit()
+    return result.rowcount
+
+# ===== 异步刷新令牌相关操作 =====
+
+class RefreshTokenReused(ValueError):
+    """已作废的刷新令牌被再次使用（令牌可能已泄露）"""
+
+    def __init__(self, message: str, user_id: int):
+        super().__init__(message)
+        self.user_id = user_id
+
+async def create_refresh_token(db: AsyncSession, user: User, family_id: Optional[str] = None,
+                               family_expires_at: Optional[int] = None) -> Tuple[str, RefreshToken]:
+    """异步签发刷新令牌，返回 (明文令牌, 数据库记录)
+
+    不传family_id表示新的登录会话；刷新时沿用原会话的family和绝对过期时间
+    """
+    now = int(time.time())
+    if family_id is None:
+        family_id = secrets.token_hex(16)
+        family_expires_at = now + REFRESH_TOKEN_MAX_DAYS * 86400
+    token = new_refresh_token()
+    record = RefreshToken(
+        token_hash=hash_refresh_token(token),
+        family_id=family_id,
+        user_id=user.id,
+        token_version=user.token_version or 0,
+        expires_at=min(now + REFRESH_TOKEN_EXPIRE_DAYS * 86400, family_expires_at),
+        family_expires_at=family_expires_at,
+        used=False
+    )
+    db.add(record)
+    await db.commit()
+    return token, record
+
+async def rotate_refresh_token(db: AsyncSession, token: str,
+                               now: Optional[int] = None) -> Tuple[User, str, RefreshToken]:
+    """异步轮换刷新令牌：作废旧令牌，签发同一family的新令牌
+
+    - 令牌不存在、已过期、用户token版本已变化：抛出 ValueError
+    - 令牌在 REFRESH_TOKEN_REUSE_GRACE_SECONDS 秒内刚被轮换过：视为并发刷新
+      （多个标签页、客户端超时重试），同样签发同一family的新令牌，会话不受影响
+    - 令牌在宽限期之后再次使用：说明被重放，作废整个family并把用户token版本加1，抛出 RefreshTokenReused
+    """
+    now = int(time.time()) if now is None else now
+    result = await db.execute(
+        select(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(token))
+    )
+    record = result.scalar_one_or_none()
+    if not record or record.expires_at <= now:
+        raise ValueError("无效的刷新令牌")
+
+    # 条件更新保证并发刷新时只有一个请求能用掉这个令牌
+    claimed = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == record.id, RefreshToken.used == False)  # noqa: E712
+        .values(used=True, replaced_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount != 1:
+        # 只查询列，拿到的是数据库中的最新值而不是会话里缓存的对象
+        current = await db.execute(
+            select(RefreshToken.replaced_at).filter(RefreshToken.id == record.id)
+        )
+        row = current.first()
+        if row is None:
+            # 并发请求中有一个检测到重放，已经删除了整个family
+            await db.commit()
+            raise ValueError("无效的刷新令牌")
+        if row.replaced_at is None or now - row.replaced_at > REFRESH_TOKEN_REUSE_GRACE_SECONDS:
+            await revoke_refresh_family(db, record.family_id)
+            await bump_token_version(db, record.user_id)
+            logger.warning(f"刷新令牌被重复使用，会话已作废: 用户ID={record.user_id}, family={record.family_id}")
+            raise RefreshTokenReused("刷新令牌已失效，请重新登录", record.user_id)
+        logger.info(f"并发刷新同一令牌，按宽限期放行: 用户ID={record.user_id}, family={record.family_id}")
+
+    user = await get_user_by_id(db, record.user_id)
+    if not user or (user.token_version or 0) != record.token_version:
+        await db.commit()
+        raise ValueError("无效的刷新令牌")
+
+    new_token, new_record = await create_refresh_token(
+        db, user, family_id=record.family_id, family_expires_at=record.family_expires_at
+    )
+    return user, new_token, new_record
+
+async def revoke_refresh_family(db: AsyncSession, family_id: str) -> None:
+    """异步作废一个登录会话的全部刷新令牌
+
+    直接删除记录：之后再出现这些令牌按"无效"处理，不会再次触发重放检测
+    （否则拿着旧令牌反复重放就能不停地让用户的新会话失效）
+    """
+    await db.execute(
+        delete(RefreshToken)
+        .where(RefreshToken.family_id == family_id)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+async def delete_expired_refresh_tokens(db: AsyncSession, now: int) -> int:
+    """异步删除已过期的刷新令牌"""
+    result = await db.execute(delete(RefreshToken).where(RefreshToken.expires_at <= now))
+    await db.commit()
+    return result.rowcount
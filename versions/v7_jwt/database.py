@@ -4,20 +4,95 @@
 配置异步SQLAlchemy和数据库连接
 """
 
+import logging
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import time
+from sqlalchemy import inspect, text, make_url
+from sqlalchemy.schema import CreateTable
+from sqlalchemy import exc
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from deadline import install_sqlite_deadline, install_postgres_deadline
+
+logger = logging.getLogger(__name__)
 
 # 异步数据库URL配置
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./blog_v4.db")
 
 
+# 连接池配置
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))              # 常驻连接数
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))       # 高峰时额外允许的连接数
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))     # 等待空闲连接的最长时间（秒）
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))       # 连接使用多久后重建（秒），-1表示不重建
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "0"))          # 启动时预先建立的连接数
+# PostgreSQL（asyncpg）：每个连接缓存的预编译语句数，0表示不缓存
+# 经过 PgBouncer 等事务级连接池时预编译语句不能跨连接复用，需要设为0
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """记录取连接耗时的连接池
+
+    耗时包括等待其他请求归还连接，以及池中没有空闲连接时新建连接的时间
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = {"checkouts": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0, "timeouts": 0}
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats["timeouts"] += 1
+            raise
+        finally:
+            waited = (time.perf_counter() - start) * 1000
+            stats = self.wait_stats
+            stats["checkouts"] += 1
+            stats["total_wait_ms"] += waited
+            if waited > stats["max_wait_ms"]:
+                stats["max_wait_ms"] = waited
+
+
+def build_engine(url: str, **kwargs) -> AsyncEngine:
+    """按URL创建异步引擎，支持 sqlite+aiosqlite 和 postgresql+asyncpg
+
+    - 连接池参数来自上面的环境变量，kwargs可以覆盖
+    - asyncpg：每个连接缓存 DB_STATEMENT_CACHE_SIZE 条预编译语句
+    - 安装对应数据库的请求截止时间检查
+    """
+    options = dict(
+        echo=False,  # 设置为True，我们就可以看到执行的SQL语句了
+        future=True,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING
+    )
+    if make_url(url).get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    options.update(kwargs)
+    engine = create_async_engine(url, **options)
+
+    # 查询超过请求截止时间时中断
+    if engine.dialect.name == "sqlite":
+        install_sqlite_deadline(engine.sync_engine)
+    elif engine.dialect.name == "postgresql":
+        install_postgres_deadline(engine.sync_engine)
+    return engine
+
+
 # 创建异步数据库引擎
-async_engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,  # 设置为True，我们就可以看到执行的SQL语句了
-    future=True
-)
+async_engine = build_engine(DATABASE_URL)
 
 
 # 创建异步会话工厂
@@ -27,12 +102,176 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False
 )
 
+# 请求级会话统计：requests 为请求数，opened 为真正创建了会话（访问了数据库）的请求数
+session_stats = {"requests": 0, "opened": 0}
+
+
+class LazySession:
+    """按需创建的数据库会话
+
+    很多请求声明了数据库依赖却用不到它（token里已有资料、缓存命中、限流提前返回），
+    这个代理在第一次访问会话的属性（execute/get/add/commit...）时才创建 AsyncSession，
+    没用到的请求不创建会话，也不会从连接池取连接
+    """
+
+    __slots__ = ("_factory", "_session")
+
+    def __init__(self, factory=AsyncSessionLocal):
+        self._factory = factory
+        self._session = None
+        session_stats["requests"] += 1
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        # 只有代理自身没有的属性才会走到这里
+        if self._session is None:
+            self._session = self._factory()
+            session_stats["opened"] += 1
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+def session_metrics() -> dict:
+    return dict(session_stats, unused=session_stats["requests"] - session_stats["opened"])
+
+
+async def warmup_pool(engine=async_engine, count: int = DB_POOL_WARMUP) -> int:
+    """启动时预先建立连接，避免部署后的第一批请求承担建连开销
+
+    同时持有count个连接才能保证建立的是不同的连接；超过pool_size的连接归还时会被关闭，
+    所以最多预热pool_size个。返回实际预热的连接数
+    """
+    count = min(count, engine.pool.size())
+    connections = []
+    try:
+        for _ in range(count):
+            conn = await engine.connect()
+            connections.append(conn)
+            await conn.exec_driver_sql("SELECT 1")
+    finally:
+        for conn in connections:
+            await conn.close()
+    return len(connections)
+
+
+def pool_metrics(engine=async_engine) -> dict:
+    """连接池状态：使用中、空闲、溢出连接数和取连接耗时"""
+    pool = engine.pool
+    metrics = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        # SQLAlchemy的overflow()在连接数不足pool_size时是负数
+        "overflow": max(0, pool.overflow()),
+    }
+    stats = getattr(pool, "wait_stats", None)
+    if stats:
+        checkouts = stats["checkouts"]
+        metrics.update(
+            checkouts=checkouts,
+            timeouts=stats["timeouts"],
+            avg_wait_ms=round(stats["total_wait_ms"] / checkouts, 3) if checkouts else 0.0,
+            max_wait_ms=round(stats["max_wait_ms"], 3)
+        )
+    return metrics
+
+
 # 创建基础模型类
 Base = declarative_base()
 
 
 # 异步数据库初始化函数
-async def create_tables():
+async def create_tables(engine: AsyncEngine = async_engine):
     """异步创建所有数据表"""
-    async with async_engine.begin() as conn:
+    async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate)
+
+
+def _migrate(conn):
+    """升级旧数据库（create_all 只建新表，不会给已存在的表加列）"""
+    columns = {column["name"] for column in inspect(conn).get_columns("users")}
+    if "email_lower" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN email_lower VARCHAR(100)"))
+        # 用Python的lower()回填，和注册时的规则一致（SQLite的lower()只处理ASCII）
+        rows = conn.execute(text("SELECT id, email FROM users")).all()
+        if rows:
+            conn.execute(
+                text("UPDATE users SET email_lower = :email_lower WHERE id = :id"),
+                [{"id": row.id, "email_lower": row.email.lower()} for row in rows]
+            )
+        logger.info("users表已添加 email_lower 列，回填 %d 行", len(rows))
+    _create_index(conn, "ix_users_email_lower", "users", "email_lower", unique=True)
+    if "token_version" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+        logger.info("users表已添加 token_version 列")
+    for table in ("users", "posts"):
+        _enable_autoincrement(conn, table)
+    inspector = inspect(conn)
+    if inspector.has_table("refresh_tokens"):
+        refresh_columns = {column["name"] for column in inspector.get_columns("refresh_tokens")}
+        if "replaced_at" not in refresh_columns:
+            conn.execute(text("ALTER TABLE refresh_tokens ADD COLUMN replaced_at INTEGER"))
+            logger.info("refresh_tokens表已添加 replaced_at 列")
+    if inspector.has_table("revoked_tokens"):
+        revoked_columns = {column["name"] for column in inspector.get_columns("revoked_tokens")}
+        if "revoked_at" not in revoked_columns:
+            # 已有记录的注销时间记为0，各进程启动时的全量同步会读到它们
+            conn.execute(text("ALTER TABLE revoked_tokens ADD COLUMN revoked_at INTEGER NOT NULL DEFAULT 0"))
+            _create_index(conn, "ix_revoked_tokens_revoked_at", "revoked_tokens", "revoked_at")
+            logger.info("revoked_tokens表已添加 revoked_at 列")
+
+
+def _enable_autoincrement(conn, table: str):
+    """把旧的SQLite表重建为 AUTOINCREMENT（SQLite不能用ALTER TABLE修改主键）
+
+    普通 INTEGER PRIMARY KEY 新建行时取 max(id)+1，删除最大id的行后这个id会被复用，
+    其他进程的id位图会把复用的id误判为不存在。PostgreSQL的序列不复用id，不需要处理
+    """
+    if conn.dialect.name != "sqlite" or table not in Base.metadata.tables:
+        return
+    row = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table}
+    ).first()
+    if row is None or "AUTOINCREMENT" in row.sql.upper():
+        return
+    model = Base.metadata.tables[table]
+    indexes = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :name AND sql IS NOT NULL"),
+        {"name": table}
+    ).scalars().all()
+    columns = ", ".join(
+        column["name"] for column in inspect(conn).get_columns(table) if column["name"] in model.c
+    )
+    new_table = f"{table}_autoincrement"
+    create_sql = str(CreateTable(model).compile(dialect=conn.dialect))
+    conn.exec_driver_sql(create_sql.replace(f"CREATE TABLE {table} (", f"CREATE TABLE {new_table} (", 1))
+    conn.exec_driver_sql(f"INSERT INTO {new_table} ({columns}) SELECT {columns} FROM {table}")
+    conn.exec_driver_sql(f"DROP TABLE {table}")
+    conn.exec_driver_sql(f"ALTER TABLE {new_table} RENAME TO {table}")
+    # 原有的索引（包括 _create_index 退回的普通索引）原样重建
+    for sql in indexes:
+        conn.exec_driver_sql(sql)
+    logger.info("%s表已重建为 AUTOINCREMENT，删除的id不再复用", table)
+
+
+def _create_index(conn, name: str, table: str, column: str, unique: bool = False):
+    """创建索引（已存在则跳过）
+
+    旧数据里如果有只差大小写的重复邮箱，唯一索引会创建失败，
+    这时退回普通索引，查询仍然走索引
+    """
+    if unique:
+        try:
+            with conn.begin_nested():
+                conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({column})"))
+            return
+        except IntegrityError:
+            logger.warning("%s.%s 存在重复值，改为创建普通索引", table, column)
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})"))
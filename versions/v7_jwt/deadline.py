@@ -0,0 +1,139 @@
+# v7_jwt/deadline.py
+"""
+请求截止时间
+截止时间保存在 ContextVar 中，随请求上下文传递到 crud 发出的每一条SQL；
+SQLite连接上安装进度回调，PostgreSQL在事务开始时设置 statement_timeout，
+查询执行到截止时间就被中断，请求返回504
+"""
+
+import os
+import sqlite3
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+# 默认的请求截止时间（秒）
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "10"))
+# 文章列表/搜索（LIKE 全表扫描）的截止时间（秒）
+SEARCH_DEADLINE_SECONDS = float(os.getenv("SEARCH_DEADLINE_SECONDS", "2"))
+# SQLite每执行多少条虚拟机指令检查一次截止时间
+PROGRESS_HANDLER_STEPS = 10000
+
+# 截止时间（time.monotonic() 的绝对值），None表示不限制
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """请求超过截止时间"""
+
+
+def get_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """剩余时间（秒），没有截止时间时返回None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def set_deadline(seconds: float) -> None:
+    """设置截止时间；已经有更早的截止时间时保留更早的"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is None or deadline < current:
+        _deadline.set(deadline)
+
+
+def check_deadline() -> None:
+    """已超过截止时间时抛出 DeadlineExceeded"""
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded("请求处理超时")
+
+
+def with_deadline(seconds: float) -> Callable:
+    """路由依赖：为请求设置截止时间
+
+    用法：@app.get(..., dependencies=[Depends(with_deadline(2))])
+    """
+    async def deadline_dependency():
+        set_deadline(seconds)
+    return deadline_dependency
+
+
+def install_sqlite_deadline(sync_engine) -> None:
+    """在SQLite引擎上安装截止时间检查
+
+    - 每个连接建立时安装进度回调；回调在aiosqlite的工作线程中执行，
+      读不到请求的ContextVar，所以执行SQL前把截止时间写到连接的info里
+    - 执行前已经超时的SQL直接抛出 DeadlineExceeded，不再发给数据库
+    - 被中断的查询（sqlite3 "interrupted"）转换为 DeadlineExceeded
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        info = connection_record.info
+        info["deadline"] = None
+
+        def progress_handler():
+            deadline = info["deadline"]
+            # 返回非0值让SQLite中断当前查询
+            return 1 if deadline is not None and time.monotonic() >= deadline else 0
+
+        dbapi_connection.run_async(
+            lambda conn: conn.set_progress_handler(progress_handler, PROGRESS_HANDLER_STEPS)
+        )
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        check_deadline()
+        conn.info["deadline"] = _deadline.get()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # 清除截止时间，之后的commit等操作不受影响
+        conn.info["deadline"] = None
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        connection = context.connection
+        if connection is not None and not connection.closed:
+            connection.info["deadline"] = None
+        original = context.original_exception
+        if isinstance(original, sqlite3.OperationalError) and "interrupted" in str(original):
+            raise DeadlineExceeded("请求处理超时") from original
+
+
+# PostgreSQL：语句因 statement_timeout 被取消时的 SQLSTATE
+PG_QUERY_CANCELED = "57014"
+
+
+def install_postgres_deadline(sync_engine) -> None:
+    """在PostgreSQL引擎上安装截止时间检查
+
+    - 事务开始时用 SET LOCAL statement_timeout 把剩余时间交给服务器，事务结束后自动失效；
+      没有截止时间的事务（后台任务）不多发这条语句
+    - 执行前已经超时的SQL直接抛出 DeadlineExceeded
+    - 被服务器取消的语句（SQLSTATE 57014）转换为 DeadlineExceeded
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "begin")
+    def on_begin(conn):
+        left = remaining()
+        if left is None:
+            return
+        if left <= 0:
+            raise DeadlineExceeded("请求处理超时")
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(left * 1000))}")
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        check_deadline()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        if getattr(context.original_exception, "sqlstate", None) == PG_QUERY_CANCELED:
+            raise DeadlineExceeded("请求处理超时") from context.original_exception
@@ -3,17 +3,29 @@ from fastapi import Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from database import AsyncSessionLocal
+import os
+from database import AsyncSessionLocal, LazySession
 from auth import verify_token
+from cache import SingleFlight, TTLCache
+from revocation import RevocationList
 import crud
 
+# 用户token版本缓存：token验签之后只需比对版本号，缓存期内不查询数据库
+# 其他worker进程修改的版本最多延迟 TOKEN_VERSION_CACHE_SECONDS 秒生效
+TOKEN_VERSION_CACHE_SECONDS = float(os.getenv("TOKEN_VERSION_CACHE_SECONDS", "30"))
+token_versions = TTLCache(ttl=TOKEN_VERSION_CACHE_SECONDS)
+token_version_flight = SingleFlight(timeout=5.0)
+
+# 已注销token的内存副本（由main中的后台任务与数据库同步）
+revoked_tokens = RevocationList()
+
 async def get_async_db():
-    """数据库会话依赖"""
-    async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+    """数据库会话依赖（第一次使用时才创建会话）"""
+    session = LazySession(AsyncSessionLocal)
+    try:
+        yield session
+    finally:
+        await session.close()
 
 def get_pagination(
     page: int = Query(1, ge=1, description="页码，从1开始"),
@@ -34,11 +46,44 @@ def get_pagination(
 
 security = HTTPBearer()
 
-async def get_current_user_id(
+async def load_token_version(user_id: int) -> Optional[int]:
+    """读取用户的token版本（带缓存，并发的缓存未命中合并为一次查询）"""
+    version = token_versions.get(user_id)
+    if version is not None:
+        return version
+
+    async def loader():
+        async with AsyncSessionLocal() as db:
+            return await crud.get_token_version(db, user_id)
+
+    version = await token_version_flight.do(user_id, loader)
+    if version is not None:
+        token_versions.set(user_id, version)
+    return version
+
+async def get_token_payload(
     credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> int:
-    token = credentials.credentials
-    payload = verify_token(token)
+) -> dict:
+    """验证token，检查是否已注销和token版本，返回token中的用户信息"""
+    payload = verify_token(credentials.credentials)
+    if revoked_tokens.is_revoked(payload["jti"]):
+        raise HTTPException(
+            status_code=401,
+            detail="token已注销，请重新登录",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    version = await load_token_version(payload["user_id"])
+    if version is None:
+        raise HTTPException(status_code=401, detail="用户不存在")
+    if payload["ver"] != version:
+        raise HTTPException(
+            status_code=401,
+            detail="token已失效，请重新登录",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+async def get_current_user_id(payload: dict = Depends(get_token_payload)) -> int:
     return payload["user_id"]
 
 async def get_current_user(
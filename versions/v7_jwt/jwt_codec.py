@@ -0,0 +1,230 @@
+# v7_jwt/jwt_codec.py
+"""
+专用的HS256 JWT编解码器
+只支持HS256一种算法，省掉通用JWT库每次调用的密钥解析、算法查找和头部构造：
+- HMAC密钥状态在构造时计算一次，每次签名/验签只 copy() 一份
+- 头部是固定的，编码结果预先算好；验签时头部与预编码结果相同就不用解析
+- 签名用 hmac.compare_digest 做常量时间比较
+- 同一个token在有效期内会被反复验证，验签通过的token（完整字符串）缓存其claims，
+  再次出现时只检查 exp/nbf，不再计算HMAC和解析JSON
+- KeyRing：多个密钥按kid索引，用当前密钥签名，旧密钥在过渡期内仍可验签
+生成的token是标准JWT，可以与python-jose、PyJWT等库互相签发和验证
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+# 没有配置密钥文件时唯一密钥的kid；改用密钥文件后，这个kid的token由 legacy 密钥验证
+DEFAULT_KID = "default"
+
+
+class InvalidTokenError(Exception):
+    """token格式错误、签名不匹配或算法不支持"""
+
+
+class ExpiredTokenError(InvalidTokenError):
+    """token已过期或尚未生效"""
+
+
+def b64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def b64url_decode(data: Union[str, bytes]) -> bytes:
+    if isinstance(data, str):
+        data = data.encode("ascii")
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+_dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+class HS256Codec:
+    """HS256签名与验签
+
+    encode(claims)：claims 中的时间字段（exp、nbf、iat）应为Unix时间戳
+    decode(token)：验证签名、exp、nbf，返回claims（调用方不应修改）；失败抛出 InvalidTokenError
+    cache_size：缓存最近验签通过的token数，0表示不缓存
+    """
+
+    def __init__(self, key: Union[str, bytes], leeway: int = 0, cache_size: int = 10000, kid: Optional[str] = None):
+        if isinstance(key, str):
+            key = key.encode()
+        self._mac = hmac.new(key, digestmod=hashlib.sha256)
+        self.leeway = leeway
+        self.cache_size = cache_size
+        self._verified: Dict[str, Dict[str, Any]] = {}
+        self.kid = kid
+        self.header = {"alg": "HS256", "typ": "JWT"} if kid is None else {"alg": "HS256", "kid": kid, "typ": "JWT"}
+        self._header_segment = b64url_encode(_dumps(self.header).encode())
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return mac.digest()
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        signing_input = self._header_segment + b"." + b64url_encode(_dumps(claims).encode())
+        return (signing_input + b"." + b64url_encode(self._sign(signing_input))).decode("ascii")
+
+    def decode(self, token: str, now: Optional[float] = None) -> Dict[str, Any]:
+        claims = self._verified.get(token)
+        if claims is None:
+            claims = self._verify(token)
+            if self.cache_size:
+                if len(self._verified) >= self.cache_size:
+                    # dict按插入顺序迭代，淘汰最早缓存的token
+                    del self._verified[next(iter(self._verified))]
+                self._verified[token] = claims
+
+        now = time.time() if now is None else now
+        exp = claims.get("exp")
+        if exp is not None:
+            if not isinstance(exp, (int, float)):
+                raise InvalidTokenError("exp格式错误")
+            if exp < now - self.leeway:
+                raise ExpiredTokenError("token已过期")
+        nbf = claims.get("nbf")
+        if nbf is not None:
+            if not isinstance(nbf, (int, float)):
+                raise InvalidTokenError("nbf格式错误")
+            if nbf > now + self.leeway:
+                raise ExpiredTokenError("token尚未生效")
+        return claims
+
+    def _verify(self, token: str) -> Dict[str, Any]:
+        """检查格式、算法和签名，返回claims"""
+        try:
+            data = token.encode("ascii")
+        except (UnicodeEncodeError, AttributeError):
+            raise InvalidTokenError("token格式错误")
+        parts = data.split(b".")
+        if len(parts) != 3:
+            raise InvalidTokenError("token格式错误")
+        header_segment, payload_segment, signature_segment = parts
+
+        if header_segment != self._header_segment:
+            # 其他库签发的token头部字段顺序可能不同，解析后再检查算法
+            self._check_header(header_segment)
+
+        # 比较编码后的签名：base64解码会忽略非法字符，比较解码结果会让同一个token有多种写法
+        expected = b64url_encode(self._sign(header_segment + b"." + payload_segment))
+        if not hmac.compare_digest(signature_segment, expected):
+            raise InvalidTokenError("签名不匹配")
+
+        try:
+            claims = json.loads(b64url_decode(payload_segment))
+        except (binascii.Error, ValueError):
+            raise InvalidTokenError("token内容格式错误")
+        if not isinstance(claims, dict):
+            raise InvalidTokenError("token内容格式错误")
+        return claims
+
+    def _check_header(self, header_segment: bytes) -> Dict[str, Any]:
+        try:
+            header = json.loads(b64url_decode(header_segment))
+        except (binascii.Error, ValueError):
+            raise InvalidTokenError("token头部格式错误")
+        if not isinstance(header, dict) or header.get("alg") != "HS256":
+            raise InvalidTokenError("不支持的签名算法")
+        return header
+
+
+class KeyRing:
+    """签名密钥环
+
+    - 用 active_kid 对应的密钥签名，token头部带上kid
+    - 验签时按头部的kid查字典找到密钥（O(1)），头部与某个密钥预编码的头部完全相同时不用解析
+    - 不带kid的token（密钥环之前签发的）和kid为 DEFAULT_KID 而密钥环里没有这个kid的token
+      （未配置密钥文件时签发的）用 legacy_kid 对应的密钥验证
+    - verify_until：旧密钥的过渡期截止时间（Unix时间戳），之后用它签名的token不再接受
+    """
+
+    def __init__(self, keys: Dict[str, Union[str, bytes]], active_kid: str,
+                 verify_until: Optional[Dict[str, float]] = None, legacy_kid: Optional[str] = None,
+                 leeway: int = 0, cache_size: int = 10000):
+        if active_kid not in keys:
+            raise ValueError(f"当前签名密钥 {active_kid} 不在密钥列表中")
+        self.active_kid = active_kid
+        self.legacy_kid = legacy_kid if legacy_kid in keys else active_kid
+        self.verify_until = dict(verify_until or {})
+        self._codecs = {
+            kid: HS256Codec(secret, leeway=leeway, cache_size=cache_size, kid=kid)
+            for kid, secret in keys.items()
+        }
+        self._by_header = {codec._header_segment: codec for codec in self._codecs.values()}
+        self._active = self._codecs[active_kid]
+
+    @property
+    def kids(self) -> Tuple[str, ...]:
+        return tuple(self._codecs)
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        return self._active.encode(claims)
+
+    def decode(self, token: str, now: Optional[float] = None) -> Dict[str, Any]:
+        if not isinstance(token, str):
+            raise InvalidTokenError("token格式错误")
+        header_segment = token.split(".", 1)[0].encode("ascii", "replace")
+        codec = self._by_header.get(header_segment)
+        if codec is None:
+            codec = self._codecs.get(self._header_kid(header_segment))
+            if codec is None:
+                raise InvalidTokenError("未知的签名密钥")
+
+        now = time.time() if now is None else now
+        until = self.verify_until.get(codec.kid)
+        if until is not None and now > until:
+            raise InvalidTokenError("签名密钥已停用")
+        return codec.decode(token, now=now)
+
+    def _header_kid(self, header_segment: bytes) -> Optional[str]:
+        try:
+            header = json.loads(b64url_decode(header_segment))
+        except (binascii.Error, ValueError):
+            raise InvalidTokenError("token头部格式错误")
+        if not isinstance(header, dict):
+            raise InvalidTokenError("token头部格式错误")
+        kid = header.get("kid")
+        if kid is None:
+            return self.legacy_kid
+        # kid来自未验证的token，不是字符串（列表、对象等）时不能用作字典键
+        if not isinstance(kid, str):
+            raise InvalidTokenError("token头部格式错误")
+        if kid == DEFAULT_KID and kid not in self._codecs:
+            # 第一次轮换：之前用 SECRET_KEY 签发的token，旧密钥在密钥文件里以 legacy 配置
+            return self.legacy_kid
+        return kid
+
+
+def load_key_ring(path: str, **options) -> KeyRing:
+    """从JSON文件加载密钥环
+
+    文件格式：
+    {
+        "active": "2024-06",
+        "legacy": "2024-01",
+        "keys": {
+            "2024-06": "新密钥",
+            "2024-01": {"secret": "旧密钥", "verify_until": 1719800000}
+        }
+    }
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    keys: Dict[str, str] = {}
+    verify_until: Dict[str, float] = {}
+    for kid, value in config["keys"].items():
+        if isinstance(value, dict):
+            keys[kid] = value["secret"]
+            if value.get("verify_until") is not None:
+                verify_until[kid] = float(value["verify_until"])
+        else:
+            keys[kid] = value
+    return KeyRing(keys, config["active"], verify_until=verify_until,
+                   legacy_kid=config.get("legacy"), **options)
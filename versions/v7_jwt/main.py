@@ -2,20 +2,34 @@
 
 from fastapi import FastAPI, HTTPException, Depends, status, Request,Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+import asyncio
 import logging
 import time
 from datetime import timedelta
 
 import crud
-from dependencies import get_async_db, get_pagination, get_current_user, get_current_user_id, verify_post_owner
-from database import create_tables
-from schemas import UserRegister, UserResponse, UserLogin, PostCreate, PostResponse, TokenResponse
-from auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from dependencies import get_async_db, get_pagination, get_token_payload, get_current_user_id, verify_post_owner, revoked_tokens, token_versions
+from database import create_tables, async_engine, AsyncSessionLocal, session_metrics, pool_metrics, warmup_pool
+from schemas import UserRegister, UserResponse, UserLogin, PostCreate, PostResponse, TokenResponse, RefreshRequest
+from auth import create_user_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from cache import SingleFlight, IdPresenceSet
+from moderation import watch_banned_words
+from passwords import HashingOverloaded, hashing_stats, get_pool
+from revocation import sync_revocations, watch_revocations
+from stats import ProbeMiddleware, ReadinessCheck, StatsSnapshot, refresh_stats, watch_stats
+from deadline import DeadlineExceeded, set_deadline, with_deadline, REQUEST_DEADLINE_SECONDS, SEARCH_DEADLINE_SECONDS
+from admission import (
+    AdmissionController, PRIORITY_HEALTH, PRIORITY_AUTH, PRIORITY_DEFAULT, PRIORITY_SEARCH
+)
+from ratelimit import (
+    SlidingWindowLimiter, retry_after_header,
+    LOGIN_IP_LIMIT, LOGIN_IP_WINDOW, LOGIN_ACCOUNT_FAILURE_LIMIT, LOGIN_ACCOUNT_WINDOW
+)
 
 
 logging.basicConfig(
@@ -28,10 +42,51 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="博客系统API v7.0",
     description="7天FastAPI学习系列 - Day7JWT版本",
-    version="7.0.0"
+    version="7.0.0",
+    # 所有请求的默认截止时间，个别路由可以用 with_deadline 设置更短的时间
+    dependencies=[Depends(with_deadline(REQUEST_DEADLINE_SECONDS))]
 )
    
 
+# 准入控制：限制同时处理的请求数，过载时按优先级排队或直接拒绝
+admission = AdmissionController()
+
+# 认证相关的路由优先于普通请求，搜索优先级最低
+AUTH_PATHS = {"/users/login", "/users/register", "/users/token/refresh", "/users/logout"}
+
+def request_priority(request: Request) -> int:
+    """根据路由确定请求优先级（数字越小越优先）"""
+    path = request.url.path
+    if path in ("/health", "/stats"):
+        return PRIORITY_HEALTH
+    if path in AUTH_PATHS:
+        return PRIORITY_AUTH
+    if path == "/posts" and request.query_params.get("keyword"):
+        return PRIORITY_SEARCH
+    return PRIORITY_DEFAULT
+
+# 准入控制中间件先于CORS注册，位于CORS之内：被拒绝的503响应同样带有CORS头
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """过载保护中间件"""
+    if not await admission.acquire(request_priority(request)):
+        logger.warning("服务过载，拒绝请求: %s %s", request.method, request.url.path)
+        return JSONResponse(
+            status_code=503,
+            content={
+                "error": True,
+                "status_code": 503,
+                "message": "服务繁忙，请稍后重试",
+                "path": request.url.path,
+                "timestamp": time.time()
+            },
+            headers={"Retry-After": "1"}
+        )
+    try:
+        return await call_next(request)
+    finally:
+        admission.release()
+
 # 添加CORS中间件 - 解决前端跨域问题
 app.add_middleware(
     CORSMiddleware,
@@ -48,6 +103,21 @@ app.add_middleware(
 
 logger.info("CORS中间件已配置，支持前端跨域访问")
 
+# 热点文章读取合并：同一篇文章的并发请求只查询一次数据库
+post_flight = SingleFlight(timeout=5.0)
+
+# 负缓存：不存在的文章/用户id直接返回404，不查询数据库
+post_ids = IdPresenceSet()
+user_ids = IdPresenceSet()
+
+# 探针与统计：就绪检查结果短时间缓存，统计数据由后台任务刷新
+readiness_check = ReadinessCheck(async_engine)
+stats_snapshot = StatsSnapshot()
+
+# 登录限流：按IP限制尝试次数，按账号限制失败次数
+login_ip_limiter = SlidingWindowLimiter(LOGIN_IP_LIMIT, LOGIN_IP_WINDOW)
+login_failure_limiter = SlidingWindowLimiter(LOGIN_ACCOUNT_FAILURE_LIMIT, LOGIN_ACCOUNT_WINDOW)
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     
@@ -114,7 +184,8 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
             "message": exc.detail,
             "path": request.url.path,
             "timestamp":time.time()
-            }
+            },
+        headers=getattr(exc, "headers", None)  # 保留 Retry-After、WWW-Authenticate 等响应头
     )
 
 @app.exception_handler(RequestValidationError)
@@ -143,6 +214,31 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         }
     )
 
+# 有专门异常处理器的异常：路由里兜底的 except Exception 要原样抛出，不能包装成500
+PROPAGATED_EXCEPTIONS = (DeadlineExceeded,)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exception_handler(request: Request, exc: DeadlineExceeded):
+    """
+    截止时间异常处理器
+    查询被中断时数据库会话随请求结束立即关闭，连接归还连接池
+    """
+    logger.warning(
+        "请求超时: %s %s",
+        request.method,
+        request.url
+    )
+    return JSONResponse(
+        status_code=504,
+        content={
+            "error": True,
+            "status_code": 504,
+            "message": str(exc),
+            "path": request.url.path,
+            "timestamp": time.time()
+        }
+    )
+
 @app.exception_handler(Exception)
 async def exception_handler(request: Request, exc: Exception):
     """
@@ -176,6 +272,36 @@ async def startup_event():
     await create_tables()
     logger.info("数据库表创建完成")
 
+    # 预先建立数据库连接（DB_POOL_WARMUP）
+    warmed = await warmup_pool()
+    if warmed:
+        logger.info(f"数据库连接池预热完成：{warmed} 个连接")
+
+    async with AsyncSessionLocal() as db:
+        post_ids.load(await crud.get_all_post_ids(db))
+        user_ids.load(await crud.get_all_user_ids(db))
+    logger.info(f"id位图加载完成：最大文章ID={post_ids.max_id}, 最大用户ID={user_ids.max_id}")
+
+    # 敏感词表热更新：启动时加载一次，之后定期检查文件
+    app.state.moderation_task = asyncio.create_task(watch_banned_words())
+
+    # token撤销列表：启动时完整加载，之后定期增量同步
+    await sync_revocations(revoked_tokens, AsyncSessionLocal)
+    app.state.revocation_task = asyncio.create_task(watch_revocations(revoked_tokens, AsyncSessionLocal))
+    logger.info(f"token撤销列表加载完成：{len(revoked_tokens)} 条")
+
+    # 统计数据：启动时刷新一次，之后由后台任务定期刷新
+    await refresh_stats(stats_snapshot, AsyncSessionLocal)
+    app.state.stats_task = asyncio.create_task(watch_stats(stats_snapshot, AsyncSessionLocal))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时停止后台任务"""
+    app.state.moderation_task.cancel()
+    app.state.revocation_task.cancel()
+    app.state.stats_task.cancel()
+    get_pool().shutdown()
+
 # ===== 根路由 =====
 
 @app.get("/")
@@ -199,27 +325,44 @@ async def root():
             "JWT认证"
         ],
     }
+# 存活探针的响应预先构建好：不访问数据库，不做JSON序列化
+LIVENESS_RESPONSE = Response(content=b"ok", media_type="text/plain")
+
+@app.get("/livez", include_in_schema=False)
+async def liveness():
+    """存活探针：进程能处理请求即返回200"""
+    return LIVENESS_RESPONSE
+
+@app.get("/readyz")
+async def readiness():
+    """就绪探针：数据库可用（SELECT 1，结果缓存 READY_CACHE_SECONDS 秒）时返回200，否则503"""
+    if await readiness_check.check():
+        return JSONResponse(content={"status": "ready"})
+    return JSONResponse(status_code=503, content={"status": "not ready"})
+
+# 探针在所有中间件之外直接处理（最后注册的中间件位于最外层）：
+# 不经过准入控制，过载时探针仍要如实反映进程和数据库的状态；也不写请求日志
+app.add_middleware(ProbeMiddleware, probes={"/livez": liveness, "/readyz": readiness})
+
+@app.get("/stats")
 @app.get("/health")
-async def health_check(db: AsyncSession = Depends(get_async_db)):
-    """健康检查API"""
-    try:
-        user_count = await crud.get_user_count(db)
-        post_count = await crud.get_post_count(db)
-        
-        logger.info(f"健康检查通过：用户数={user_count}, 文章数={post_count}")
-        
-        return {
-            "status": "healthy",
-            "version": "7.0.0",
-            "users_count": user_count,
-            "posts_count": post_count,
-            "database": "SQLite with async support",
-            "middleware": "CORS、日志、异常处理、JWT认证",
-            "performance": "异步优化已启用"
-        }
-    except Exception as e:
-        logger.error(f"健康检查失败：{str(e)}")
-        raise HTTPException(status_code=503, detail="服务不可用")
+async def stats():
+    """运行统计（/health 为兼容保留的别名）
+
+    用户数、文章数来自后台定期刷新的快照，请求本身不访问数据库
+    """
+    return {
+        "status": "healthy" if stats_snapshot.error is None else "degraded",
+        "version": "7.0.0",
+        **stats_snapshot.as_dict(),
+        "database": f"{async_engine.dialect.name} ({async_engine.dialect.driver}) with async support",
+        "middleware": "CORS、日志、异常处理、JWT认证",
+        "performance": "异步优化已启用",
+        "password_hashing": hashing_stats(),
+        "admission": admission.metrics(),
+        "db_sessions": session_metrics(),
+        "db_pool": pool_metrics()
+    }
 
 # ===== 异步用户相关API =====
 
@@ -237,6 +380,7 @@ async def register_user(user_data: UserRegister, db: AsyncSession = Depends(get_
             password=user_data.password
         )
         logger.info(f"用户注册成功: ID={db_user.id}, 用户名={db_user.username}")
+        user_ids.add(db_user.id)
         
         return UserResponse(
             id=db_user.id,
@@ -247,41 +391,99 @@ async def register_user(user_data: UserRegister, db: AsyncSession = Depends(get_
     except ValueError as e:
         logger.warning(f"用户注册失败: {str(e)} - 用户名={user_data.username}")
         raise HTTPException(status_code=400, detail=str(e))
+    except HashingOverloaded as e:
+        logger.warning(f"用户注册被拒绝: 密码哈希线程池已满 - 用户名={user_data.username}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except PROPAGATED_EXCEPTIONS:
+        raise
     except Exception as e:
         logger.error(f"用户注册异常: {str(e)} - 用户名={user_data.username}")
         raise HTTPException(status_code=500, detail=f"创建用户失败: {str(e)}")
 
 @app.post("/users/login", response_model=TokenResponse)
-async def login_user(login_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
+async def login_user(login_data: UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
     """用户登录"""
     logger.info(f"用户登录请求： 账户={login_data.account}")
+
+    # 限流检查放在查询数据库和计算密码哈希之前
+    client_ip = request.client.host if request.client else "unknown"
+    account_key = login_data.account.strip().lower()
+    wait = login_ip_limiter.hit(client_ip) or login_failure_limiter.retry_after(account_key)
+    if wait:
+        logger.warning(f"登录被限流: 账号={login_data.account}, IP={client_ip}")
+        raise HTTPException(
+            status_code=429,
+            detail="登录尝试过于频繁，请稍后再试",
+            headers={"Retry-After": retry_after_header(wait)}
+        )
     
-    user = await crud.authenticate_user(db, login_data.account, login_data.password)
+    try:
+        user = await crud.authenticate_user(db, login_data.account, login_data.password)
+    except HashingOverloaded as e:
+        logger.warning(f"登录被拒绝: 密码哈希线程池已满 - 账号={login_data.account}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     if not user:
+        login_failure_limiter.add(account_key)
         logger.warning(f"登录失败: 账号或密码错误 - 账号={login_data.account}")
         raise HTTPException(status_code=401, detail="用户名或密码错误")
 
     logger.info(f"用户登录成功: ID={user.id}, 用户名={user.username}")
 
-    # Day7 新增：创建并返回JWT token
+    # Day7 新增：创建并返回JWT token，同时签发刷新令牌
+    refresh_token, refresh_record = await crud.create_refresh_token(db, user)
+    return issue_tokens(user, refresh_token, refresh_record)
+
+def issue_tokens(user, refresh_token: str, refresh_record) -> dict:
+    """组装登录/刷新的响应：访问token + 刷新令牌"""
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": str(user.id)}, 
-        expires_delta=access_token_expires
+    access_token = create_user_access_token(
+        user,
+        expires_delta=access_token_expires,
+        session_id=refresh_record.family_id
     )
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+        "refresh_expires_in": max(0, refresh_record.expires_at - int(time.time()))
     }
 
+@app.post("/users/token/refresh", response_model=TokenResponse)
+async def refresh_access_token(refresh_data: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """用刷新令牌换取新的访问token（不需要密码，刷新令牌同时轮换）"""
+    try:
+        user, refresh_token, refresh_record = await crud.rotate_refresh_token(db, refresh_data.refresh_token)
+    except crud.RefreshTokenReused as e:
+        # 本进程立即生效；其他进程在token版本缓存过期后生效
+        token_versions.pop(e.user_id)
+        raise HTTPException(status_code=401, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+    return issue_tokens(user, refresh_token, refresh_record)
+
 @app.get("/users/profile", response_model=UserResponse)
 async def get_current_user(
-    current_user = Depends(get_current_user)
+    payload: dict = Depends(get_token_payload),
+    db: AsyncSession = Depends(get_async_db)
     ):
-    """获取当前用户信息"""
-    
+    """获取当前用户信息
+
+    token携带了资料声明时直接返回，不查询数据库；旧token没有这些声明时再查数据库
+    """
+    if payload["username"] and payload["email"] and payload["created_at"]:
+        return UserResponse(
+            id=payload["user_id"],
+            username=payload["username"],
+            email=payload["email"],
+            created_at=payload["created_at"]
+        )
+
+    current_user = await crud.get_user_by_id(db, payload["user_id"])
+    if not current_user:
+        raise HTTPException(status_code=401, detail="用户不存在")
     return UserResponse(
         id=current_user.id,
         username=current_user.username,
@@ -290,6 +492,23 @@ async def get_current_user(
     )
 
 
+@app.post("/users/logout")
+async def logout_user(
+    payload: dict = Depends(get_token_payload),
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    """注销当前token（本进程立即生效，其他进程在下次同步后生效）"""
+    if not payload["jti"]:
+        raise HTTPException(status_code=400, detail="该token不支持注销，请重新登录获取新token")
+
+    await crud.revoke_token(db, payload["jti"], payload["user_id"], payload["exp"])
+    revoked_tokens.add(payload["jti"], payload["exp"])
+    if payload["sid"]:
+        # 同一次登录的刷新令牌一并作废
+        await crud.revoke_refresh_family(db, payload["sid"])
+    logger.info(f"用户注销成功: ID={payload['user_id']}")
+    return {"message": "注销成功"}
+
 @app.get("/users", response_model=List[UserResponse])
 async def list_users(db: AsyncSession = Depends(get_async_db)):
     """获取用户列表"""
@@ -318,6 +537,7 @@ async def create_post_api(post_data: PostCreate, current_user_id: int = Depends(
             content=post_data.content,
             author_id=current_user_id
         )
+        post_ids.add(db_post.id)
         
         return PostResponse(
             id=db_post.id,
@@ -329,10 +549,16 @@ async def create_post_api(post_data: PostCreate, current_user_id: int = Depends(
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except PROPAGATED_EXCEPTIONS:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建文章失败: {str(e)}")
 
-@app.get("/posts", response_model=List[PostResponse])
+@app.get(
+    "/posts",
+    response_model=List[PostResponse],
+    dependencies=[Depends(with_deadline(SEARCH_DEADLINE_SECONDS))]
+)
 async def list_posts(
     pagination = Depends(get_pagination),
     keyword: Optional[str] = Query(None, description="搜索关键词"),
@@ -356,29 +582,52 @@ async def list_posts(
         for post in posts
     ]
 
+async def load_post_response(post_id: int) -> Optional[PostResponse]:
+    """加载文章并序列化（single-flight的加载函数）
+
+    使用独立的会话，不依赖某个具体请求的生命周期；
+    截止时间也是自己的（等待者最多等 post_flight.timeout 秒），不沿用领头请求剩下的时间
+    """
+    set_deadline(post_flight.timeout)
+    async with AsyncSessionLocal() as db:
+        post = await crud.get_post_by_id(db, post_id)
+        if not post:
+            return None
+        post_ids.add(post.id)
+        return PostResponse(
+            id=post.id,
+            title=post.title,
+            content=post.content,
+            author_id=post.author_id,
+            created_at=post.created_at,
+            updated_at=post.updated_at
+        )
+
 @app.get("/posts/{post_id}", response_model=PostResponse)
-async def get_post(post_id: int, db: AsyncSession = Depends(get_async_db)):
-    """获取单篇文章"""
-    post = await crud.get_post_by_id(db, post_id)
+async def get_post(post_id: int):
+    """获取单篇文章（并发读取合并为一次查询）"""
+    if not post_ids.might_exist(post_id):
+        raise HTTPException(status_code=404, detail="文章不存在")
+    try:
+        post = await post_flight.do(post_id, lambda: load_post_response(post_id))
+    except asyncio.TimeoutError:
+        logger.warning(f"读取文章超时: ID={post_id}")
+        raise HTTPException(status_code=504, detail="读取文章超时")
     if not post:
         raise HTTPException(status_code=404, detail="文章不存在")
     
-    return PostResponse(
-        id=post.id,
-        title=post.title,
-        content=post.content,
-        author_id=post.author_id,
-        created_at=post.created_at,
-        updated_at=post.updated_at
-    )
+    return post
 
 @app.get("/users/{user_id}/posts", response_model=List[PostResponse])
 async def get_user_posts(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取指定用户的所有文章"""
-    # 检查用户是否存在
+    # 检查用户是否存在（位图能确定不存在时不查询数据库）
+    if not user_ids.might_exist(user_id):
+        raise HTTPException(status_code=404, detail="用户不存在")
     user = await crud.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
+    user_ids.add(user.id)
     
     posts = await crud.get_posts_by_user(db, user_id)
     return [
@@ -409,6 +658,7 @@ async def update_post_api(
             title=post_data.title, 
             content=post_data.content
         )
+        post_flight.forget(post_id)
         
         return PostResponse(
             id=updated_post.id,
@@ -418,6 +668,8 @@ async def update_post_api(
             created_at=updated_post.created_at,
             updated_at=updated_post.updated_at
         )
+    except PROPAGATED_EXCEPTIONS:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新文章失败: {str(e)}")
 
@@ -429,6 +681,7 @@ async def delete_post_api(
     ):
     """删除文章""" 
     success = await crud.delete_post(db, post_id)
+    post_flight.forget(post_id)
     if not success:
         raise HTTPException(status_code=500, detail="删除文章失败")
     
@@ -1,27 +1,44 @@
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 from database import Base
 
 class User(Base):
 
     __tablename__ = "users"
+    # AUTOINCREMENT：删除最大id的行后id不会被复用（id位图依赖这一点，见 cache.IdPresenceSet）
+    __table_args__ = {"sqlite_autoincrement": True}
+    # 插入时用 RETURNING 取回服务器生成的 created_at 等默认值，不需要再 refresh 查询一次
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, index=True, nullable=False)
     email = Column(String(100), unique=True, index=True, nullable=False)
+    # 小写邮箱：登录和注册按它查询，大小写不敏感且只走一个唯一索引
+    email_lower = Column(String(100), unique=True, index=True, nullable=False)
     hashed_password = Column(String(100),nullable=False)
+    # token版本：写入JWT，加1后该用户之前签发的token全部失效
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     posts = relationship("Post", back_populates="author",cascade="all,delete")
 
+    @validates("email")
+    def _sync_email_lower(self, key, email):
+        """设置邮箱时同步更新小写邮箱"""
+        self.email_lower = email.lower()
+        return email
+
     def __repr__(self):
         return f"<User(id={self.id}, username={self.username}, email={self.email})>"
     
 class Post(Base):
 
     __tablename__ = "posts"
+    __table_args__ = {"sqlite_autoincrement": True}
+    # 插入/更新时用 RETURNING 取回 created_at、updated_at，不需要再 refresh 查询一次
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False, index=True)
@@ -34,4 +51,44 @@ class Post(Base):
     author = relationship("User", back_populates="posts")
 
     def __repr__(self):
-        return f"<Post(id={self.id}, title={self.title}, author_id={self.author_id})>"
\ No newline at end of file
+        return f"<Post(id={self.id}, title={self.title}, author_id={self.author_id})>"
+
+
+class RevokedToken(Base):
+    """已注销的token（按jti记录，token过期后即可删除）"""
+
+    __tablename__ = "revoked_tokens"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    jti = Column(String(64), unique=True, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    expires_at = Column(Integer, nullable=False, index=True)  # token的exp（Unix时间戳，秒）
+    # 注销时间，各进程按它增量同步（自增id的提交顺序和分配顺序不一定相同，不能用来同步）
+    revoked_at = Column(Integer, nullable=False, default=0, index=True)
+
+    def __repr__(self):
+        return f"<RevokedToken(jti={self.jti}, user_id={self.user_id}, expires_at={self.expires_at})>"
+
+
+class RefreshToken(Base):
+    """刷新令牌（只保存sha256摘要，不保存明文）
+
+    每次刷新都会作废旧令牌并签发新令牌，同一次登录产生的令牌属于同一个family；
+    已作废的令牌在宽限期之后被再次使用说明令牌泄露，整个family随之失效
+    """
+
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    family_id = Column(String(32), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    token_version = Column(Integer, nullable=False)          # 签发时用户的token版本
+    expires_at = Column(Integer, nullable=False, index=True)  # 滑动过期时间（Unix时间戳，秒）
+    family_expires_at = Column(Integer, nullable=False)       # 整个会话的绝对过期时间
+    used = Column(Boolean, nullable=False, default=False)
+    replaced_at = Column(Integer, nullable=True)              # 被轮换的时间，用于区分并发刷新和重放
+
+    def __repr__(self):
+        return f"<RefreshToken(id={self.id}, family_id={self.family_id}, user_id={self.user_id}, used={self.used})>"
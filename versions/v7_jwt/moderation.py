@@ -0,0 +1,179 @@
+# v7_jwt/moderation.py
+"""
+内容审核：敏感词匹配
+敏感词表预编译成 Aho–Corasick 自动机，文本只需扫描一遍
+词表从文件加载，文件修改后自动重新编译并替换，无需重启
+"""
+
+import asyncio
+import logging
+import os
+import re
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 默认敏感词表（词表文件不存在时使用）
+DEFAULT_BANNED_WORDS = ['黑胡子', '白胡子', '茶胡子']
+
+# 词表文件：每行一个敏感词，#开头的行是注释
+BANNED_WORDS_FILE = os.getenv("BANNED_WORDS_FILE", "banned_words.txt")
+# 检查文件是否修改的间隔（秒）
+BANNED_WORDS_CHECK_INTERVAL = float(os.getenv("BANNED_WORDS_CHECK_INTERVAL", "5"))
+
+
+class BannedWordMatcher:
+    """敏感词多模式匹配器（Aho–Corasick自动机）
+
+    - 构建：所有敏感词插入字典树，再用BFS计算失败指针，O(敏感词总长度)
+    - 匹配：逐字符转移状态，O(文本长度)，与敏感词数量无关
+    - 处于根状态时，用预编译的首字符集合正则跳到下一个可能的起点，
+      干净文本大部分在C代码里跳过
+    构建完成后不再修改，可以被多个请求并发读取
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self.words: List[str] = []
+        seen = set()
+        goto = [{}]       # 状态转移：goto[状态][字符] -> 下一状态
+        fail = [0]        # 失败指针
+        output = [-1]     # 到达该状态时匹配到的敏感词下标，-1表示没有
+
+        for word in words:
+            word = word.strip().lower()
+            if not word or word in seen:
+                continue
+            seen.add(word)
+            index = len(self.words)
+            self.words.append(word)
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto.append({})
+                    fail.append(0)
+                    output.append(-1)
+                    goto[state][ch] = nxt
+                state = nxt
+            if output[state] == -1:
+                output[state] = index
+
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                if output[nxt] == -1:
+                    output[nxt] = output[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+        first_chars = "".join(re.escape(ch) for ch in goto[0])
+        self._first = re.compile(f"[{first_chars}]") if first_chars else None
+
+    def find(self, text: str) -> Optional[str]:
+        """返回文本中最先出现的敏感词，没有则返回None（文本应已转为小写）"""
+        if self._first is None:
+            return None
+        goto, fail, output = self._goto, self._fail, self._output
+        search = self._first.search
+        state = 0
+        i = 0
+        n = len(text)
+        while i < n:
+            if state == 0:
+                m = search(text, i)
+                if m is None:
+                    return None
+                i = m.start()
+            ch = text[i]
+            while True:
+                nxt = goto[state].get(ch)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+            if output[state] != -1:
+                return self.words[output[state]]
+            i += 1
+        return None
+
+
+# 当前生效的匹配器；更新敏感词表时整体替换引用（原子操作），读者不需要加锁
+_matcher = BannedWordMatcher(DEFAULT_BANNED_WORDS)
+
+
+def set_banned_words(words: Iterable[str]) -> BannedWordMatcher:
+    """重新构建敏感词自动机并原子替换"""
+    global _matcher
+    matcher = BannedWordMatcher(words)
+    _matcher = matcher
+    return matcher
+
+
+def get_matcher() -> BannedWordMatcher:
+    """获取当前生效的匹配器"""
+    return _matcher
+
+
+def find_banned_word(text: str) -> Optional[str]:
+    """检查文本，返回命中的敏感词"""
+    return _matcher.find(text.lower())
+
+
+# ===== 词表文件加载与热更新 =====
+
+# 已加载文件的签名 (mtime_ns, size)，用于判断文件是否修改
+_loaded_signature: Optional[Tuple[int, int]] = None
+
+
+def load_banned_words_file(path: str) -> List[str]:
+    """读取词表文件"""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def reload_if_changed(path: str = BANNED_WORDS_FILE) -> bool:
+    """文件有变化时重新加载词表（同步函数，包含文件I/O，需在线程池中调用）
+
+    返回是否发生了替换
+    """
+    global _loaded_signature
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        if _loaded_signature is not None:
+            logger.warning("敏感词文件 %s 不存在，继续使用当前词表", path)
+            _loaded_signature = None
+        return False
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    if signature == _loaded_signature:
+        return False
+
+    words = load_banned_words_file(path)
+    matcher = set_banned_words(words)
+    _loaded_signature = signature
+    logger.info("敏感词表已更新：%s，共 %d 个词", path, len(matcher.words))
+    return True
+
+
+async def watch_banned_words(path: str = BANNED_WORDS_FILE, interval: float = BANNED_WORDS_CHECK_INTERVAL) -> None:
+    """后台任务：定期检查词表文件，文件I/O和编译都在线程池中执行，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, reload_if_changed, path)
+        except Exception as e:
+            # 文件格式错误等问题不影响当前生效的词表
+            logger.error("重新加载敏感词表失败：%s", e)
+        await asyncio.sleep(interval)
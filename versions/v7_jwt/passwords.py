@@ -0,0 +1,186 @@
+# v7_jwt/passwords.py
+"""
+密码哈希
+使用标准库的 scrypt（内存困难型KDF）代替裸的 sha256，
+哈希和校验在专用的有界线程池中执行，不阻塞事件循环
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+# scrypt参数：n=2^14, r=8 时每次计算约占用16MB内存、数十毫秒CPU
+SCRYPT_N = int(os.getenv("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# 线程池大小；hashlib.scrypt 在计算期间释放GIL，线程池即可利用多核
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 允许排队等待的任务数，超出时直接拒绝（由调用方返回503），避免请求无限堆积
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+
+class HashingOverloaded(Exception):
+    """密码哈希线程池已满"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+# 账号不存在时用来校验的哈希：当前的scrypt参数，全0的盐和哈希值。
+# 校验一定失败，但和真实账号一样要在线程池里算一次scrypt，响应时间不会暴露账号是否存在
+DUMMY_HASH = (
+    f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$"
+    f"{_b64encode(bytes(SALT_BYTES))}${_b64encode(bytes(KEY_BYTES))}"
+)
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * n * r * 2, dklen=KEY_BYTES
+    )
+
+
+def is_legacy_hash(stored: str) -> bool:
+    """旧版本的密码是64位十六进制的sha256"""
+    return len(stored) == 64 and not stored.startswith("scrypt$")
+
+
+def hash_password_sync(password: str) -> str:
+    """计算密码哈希（同步，CPU密集）
+
+    格式：scrypt$n$r$p$盐$哈希，约83个字符，放得下 hashed_password 列（String(100)）
+    """
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(key)}"
+
+
+def verify_password_sync(password: str, stored: str) -> bool:
+    """校验密码（同步），同时支持旧版sha256哈希"""
+    if is_legacy_hash(stored):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+    try:
+        scheme, n, r, p, salt, key = stored.split("$")
+        if scheme != "scrypt":
+            return False
+        expected = _b64decode(key)
+        actual = _scrypt(password, _b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored: str) -> bool:
+    """旧版sha256或参数低于当前配置的哈希需要在登录成功后重新计算"""
+    if is_legacy_hash(stored):
+        return True
+    parts = stored.split("$")
+    return len(parts) != 6 or parts[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+class HashingPool:
+    """有界的密码哈希线程池
+
+    - 同时执行的任务数 = workers，最多再排队 max_pending 个，超出时抛出 HashingOverloaded
+    - stats 记录执行中/排队中的任务数、最大排队深度、最长排队时间、完成数和拒绝数
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {
+            "in_flight": 0,
+            "queued": 0,
+            "max_queue_depth": 0,
+            "max_wait_ms": 0.0,
+            "completed": 0,
+            "rejected": 0,
+        }
+
+    async def run(self, func: Callable, *args):
+        """在线程池中执行 func(*args) 并等待结果"""
+        with self._lock:
+            stats = self.stats
+            if stats["in_flight"] + stats["queued"] >= self.workers + self.max_pending:
+                stats["rejected"] += 1
+                raise HashingOverloaded("密码服务繁忙，请稍后重试")
+            stats["queued"] += 1
+            # 排队深度 = 除正在执行的任务外还在等待的任务数
+            depth = max(0, stats["in_flight"] + stats["queued"] - self.workers)
+            if depth > stats["max_queue_depth"]:
+                stats["max_queue_depth"] = depth
+        job = self._executor.submit(self._call, func, args, time.perf_counter())
+        job.add_done_callback(self._release_cancelled)
+        # 等待的请求被取消（客户端断开、超过截止时间）时，还在排队的任务随之取消
+        return await asyncio.wrap_future(job)
+
+    def _release_cancelled(self, job) -> None:
+        """排队中被取消的任务不会执行 _call，在这里归还排队名额"""
+        if job.cancelled():
+            with self._lock:
+                self.stats["queued"] -= 1
+
+    def _call(self, func: Callable, args: tuple, submitted: float):
+        wait_ms = (time.perf_counter() - submitted) * 1000
+        with self._lock:
+            self.stats["queued"] -= 1
+            self.stats["in_flight"] += 1
+            if wait_ms > self.stats["max_wait_ms"]:
+                self.stats["max_wait_ms"] = round(wait_ms, 3)
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.stats["in_flight"] -= 1
+                self.stats["completed"] += 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+# 全局线程池（每个进程一个）
+_pool = HashingPool()
+
+
+def get_pool() -> HashingPool:
+    return _pool
+
+
+async def hash_password(password: str) -> str:
+    """在线程池中计算密码哈希"""
+    return await _pool.run(hash_password_sync, password)
+
+
+async def verify_password(password: str, stored: Optional[str]) -> bool:
+    """校验密码；旧版sha256只需一次哈希，直接计算，scrypt放进线程池"""
+    if not stored:
+        return False
+    if is_legacy_hash(stored):
+        return verify_password_sync(password, stored)
+    return await _pool.run(verify_password_sync, password, stored)
+
+
+def hashing_stats() -> Dict[str, float]:
+    """线程池指标（用于健康检查）"""
+    stats = dict(_pool.stats)
+    stats["workers"] = _pool.workers
+    stats["max_pending"] = _pool.max_pending
+    return stats
@@ -0,0 +1,92 @@
+# v7_jwt/ratelimit.py
+"""
+登录限流
+滑动窗口计数器：按IP限制登录尝试次数，按账号限制失败次数，
+超限的请求在查询数据库和计算密码哈希之前直接返回429
+"""
+
+import math
+import os
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+# 每个IP在窗口内最多尝试登录的次数
+LOGIN_IP_LIMIT = int(os.getenv("LOGIN_IP_LIMIT", "20"))
+LOGIN_IP_WINDOW = float(os.getenv("LOGIN_IP_WINDOW", "60"))
+# 每个账号在窗口内最多允许的登录失败次数
+LOGIN_ACCOUNT_FAILURE_LIMIT = int(os.getenv("LOGIN_ACCOUNT_FAILURE_LIMIT", "5"))
+LOGIN_ACCOUNT_WINDOW = float(os.getenv("LOGIN_ACCOUNT_WINDOW", "300"))
+
+
+class SlidingWindowLimiter:
+    """滑动窗口限流器（两段计数近似）
+
+    时间按 window 对齐分段，每个key只在当前段和上一段各保存一个整数计数，
+    滑动窗口内的次数估算为：上一段计数 × 上一段仍在窗口内的比例 + 当前段计数
+    - 内存：每个活跃key两个整数
+    - 过期清理：进入新时间段时整个丢弃更早一段的字典，不需要逐个key扫描
+    计数保存在当前进程内，多个worker时每个worker各自计数
+    """
+
+    def __init__(self, limit: int, window: float, clock: Callable[[], float] = time.monotonic):
+        self.limit = limit
+        self.window = window
+        self._clock = clock
+        self._period = int(clock() // window)
+        self._current: Dict[Hashable, int] = {}
+        self._previous: Dict[Hashable, int] = {}
+        self.stats = {"limited": 0}
+
+    def _elapsed(self, now: float) -> float:
+        """切换时间段，返回当前段已过去的比例（0~1）"""
+        period = int(now // self.window)
+        if period != self._period:
+            self._previous = self._current if period == self._period + 1 else {}
+            self._current = {}
+            self._period = period
+        return now / self.window - period
+
+    def retry_after(self, key: Hashable, now: Optional[float] = None) -> float:
+        """未超限返回0，超限时返回需要等待的秒数"""
+        now = self._clock() if now is None else now
+        if self.limit <= 0:
+            # 限额为0表示全部拒绝（例如临时关闭登录），没有可以等到的时刻，按一个窗口返回
+            self.stats["limited"] += 1
+            return self.window
+        elapsed = self._elapsed(now)
+        current = self._current.get(key, 0)
+        previous = self._previous.get(key, 0)
+        # 允许的条件：再记录一次后估算次数不超过limit
+        allowed = self.limit - 1
+        if previous * (1 - elapsed) + current <= allowed:
+            return 0.0
+
+        self.stats["limited"] += 1
+        if current > allowed:
+            # 当前段已经用完：等到下一段，并且当前段的计数按比例滑出窗口
+            wait = (1 - elapsed) + (1 - allowed / current)
+        else:
+            # 等上一段的计数滑出足够多
+            wait = (1 - (allowed - current) / previous) - elapsed
+        return wait * self.window + 1e-6
+
+    def add(self, key: Hashable, now: Optional[float] = None) -> None:
+        """记录一次"""
+        now = self._clock() if now is None else now
+        self._elapsed(now)
+        self._current[key] = self._current.get(key, 0) + 1
+
+    def hit(self, key: Hashable, now: Optional[float] = None) -> float:
+        """检查并记录一次：未超限时计数加1并返回0，超限时不计数，返回需要等待的秒数"""
+        wait = self.retry_after(key, now)
+        if not wait:
+            self.add(key, now)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._current.keys() | self._previous.keys())
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After 头只能是整数秒，向上取整"""
+    return str(max(1, math.ceil(seconds)))
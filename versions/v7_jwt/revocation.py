@@ -0,0 +1,109 @@
+# v7_jwt/revocation.py
+"""
+token撤销列表
+撤销记录保存在SQLite（revoked_tokens表），每个worker在内存中保存一份副本：
+验证token时只做一次字典查找，不访问数据库
+
+为什么不用布隆过滤器：
+布隆过滤器的意义是在访问慢速存储之前先排除"一定不在"的情况。
+这里的精确集合本身就在内存里，Python字典查找是一次哈希+比较，
+布隆过滤器在纯Python里要算k次哈希、访问k个bit，反而更慢，也省不了多少内存
+（同时存活的撤销记录只有过期时间内注销的token，数量很小）
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import crud
+
+logger = logging.getLogger(__name__)
+
+# 从数据库同步其他进程撤销记录的间隔（秒）：其他worker注销的token最多延迟这么久失效
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+# 增量同步时向前多读的时间（秒）：注销时间早于提交时间（事务耗时）或各节点时钟有偏差时，
+# 晚提交的记录落在已同步过的时间段里，多读一段保证不会漏掉，重复读到的记录合并时覆盖即可
+REVOCATION_SYNC_OVERLAP_SECONDS = int(os.getenv("REVOCATION_SYNC_OVERLAP_SECONDS", "60"))
+# 清理数据库中过期撤销记录的间隔（秒）
+REVOCATION_PRUNE_SECONDS = float(os.getenv("REVOCATION_PRUNE_SECONDS", "300"))
+
+
+class RevocationList:
+    """已撤销token的内存副本：jti -> 过期时间
+
+    - add()：本进程注销token时立即生效
+    - merge()：合并从数据库增量读取的记录，记住读到的最晚注销时间
+    - prune()：删除已过期的记录（过期的token本身就无法通过验签）
+    """
+
+    def __init__(self):
+        self._revoked: Dict[str, int] = {}
+        self.synced_until = 0
+        self.stats = {"checks": 0, "revoked_hits": 0, "synced": 0, "pruned": 0}
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        self.stats["checks"] += 1
+        if jti is not None and jti in self._revoked:
+            self.stats["revoked_hits"] += 1
+            return True
+        return False
+
+    def add(self, jti: str, expires_at: int) -> None:
+        self._revoked[jti] = expires_at
+
+    def merge(self, rows: Iterable[Tuple[int, str, int]]) -> None:
+        for revoked_at, jti, expires_at in rows:
+            if jti not in self._revoked:
+                self.stats["synced"] += 1
+            self._revoked[jti] = expires_at
+            if revoked_at > self.synced_until:
+                self.synced_until = revoked_at
+
+    def prune(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        expired = [jti for jti, expires_at in self._revoked.items() if expires_at <= now]
+        for jti in expired:
+            del self._revoked[jti]
+        self.stats["pruned"] += len(expired)
+        return len(expired)
+
+
+async def sync_revocations(
+    revocations: RevocationList,
+    session_factory,
+    overlap: int = REVOCATION_SYNC_OVERLAP_SECONDS,
+) -> None:
+    """从数据库增量读取新的撤销记录（从上次读到的最晚注销时间往前overlap秒开始读）"""
+    async with session_factory() as db:
+        rows = await crud.get_revoked_tokens_since(db, revocations.synced_until - overlap)
+    revocations.merge(rows)
+
+
+async def watch_revocations(
+    revocations: RevocationList,
+    session_factory,
+    interval: float = REVOCATION_SYNC_SECONDS,
+    prune_interval: float = REVOCATION_PRUNE_SECONDS,
+) -> None:
+    """后台任务：定期同步其他进程的撤销记录，并清理过期的撤销记录和刷新令牌"""
+    last_prune = 0.0
+    while True:
+        try:
+            await sync_revocations(revocations, session_factory)
+            if time.monotonic() - last_prune >= prune_interval:
+                revocations.prune()
+                async with session_factory() as db:
+                    deleted = await crud.delete_expired_revocations(db, int(time.time()))
+                    expired_refresh = await crud.delete_expired_refresh_tokens(db, int(time.time()))
+                if deleted or expired_refresh:
+                    logger.info("已清理 %d 条过期的token撤销记录、%d 个过期的刷新令牌", deleted, expired_refresh)
+                last_prune = time.monotonic()
+        except Exception as e:
+            # 同步失败时继续使用现有副本，下次再试
+            logger.error("同步token撤销列表失败：%s", e)
+        await asyncio.sleep(interval)
@@ -4,24 +4,60 @@
 定义所有的Pydantic模型用于数据验证
 """
 import re
+import string
 from typing import Optional
 from datetime import datetime
 from pydantic import BaseModel, Field, EmailStr, validator
 
+from moderation import find_banned_word
+
 
 def validate_content_safety(content: str) -> str:
-    # 定义敏感词列表（实际项目中应该从数据库或配置文件读取）
-    banned_words = [
-        '黑胡子','白胡子','茶胡子'
-    ]
-
-    content_lower = content.lower()
-    for banned_word in banned_words:
-        if banned_word in content_lower:
-            raise ValueError(f'内容中包含敏感词: {banned_word}')
+    # 敏感词表预编译为自动机（见moderation.py），文本只扫描一遍
+    banned_word = find_banned_word(content)
+    if banned_word:
+        raise ValueError(f'内容中包含敏感词: {banned_word}')
     return content
 
 
+# 密码规则（模块加载时预编译）
+_UPPERCASE = frozenset(string.ascii_uppercase)
+_LOWERCASE = frozenset(string.ascii_lowercase)
+_ASCII_DIGITS = frozenset(string.digits)
+_SPECIAL_CHARS = frozenset('!@#$%^&*(),.?":{}|<>')
+_DIGIT = re.compile(r'\d')  # 全角等Unicode十进制数字也算数字
+_REPEATED_CHARS = re.compile(r'(.)\1{2,}')
+_SEQUENTIAL_DIGITS = re.compile(r'012|123|234|345|456|567|678|789')
+_SEQUENTIAL_LETTERS = re.compile(
+    r'abc|bcd|cde|def|efg|fgh|ghi|hij|ijk|jkl|klm|lmn|mno|nop|opq|pqr|qrs|rst|stu|tuv|uvw|vwx|wxy|xyz'
+)
+
+
+def check_password_policy(password: str) -> Optional[str]:
+    """检查密码强度，返回第一条不满足的规则对应的错误信息
+
+    规则顺序和错误信息与逐条正则检查完全一致：
+    - 字符类别用集合判断，在C层面遍历字符串，找到即停
+    - 正则全部预编译，省去每次调用时 re 模块的缓存查找
+    - 只有ASCII中没有数字时才用 \\d 检查Unicode数字
+    """
+    if _UPPERCASE.isdisjoint(password):
+        return '密码必须包含一个至少一个大写字母'
+    if _LOWERCASE.isdisjoint(password):
+        return '密码必须包含至少一个小写字母'
+    if _ASCII_DIGITS.isdisjoint(password) and not _DIGIT.search(password):
+        return '密码必须包含至少一个数字'
+    if _SPECIAL_CHARS.isdisjoint(password):
+        return '密码必须包含至少一个特殊字符(!@#$%^&*等)'
+    if _REPEATED_CHARS.search(password):
+        return '密码不能包含3个以上连续相同字符'
+    if _SEQUENTIAL_DIGITS.search(password):
+        return '密码不能包含连续数字'
+    if _SEQUENTIAL_LETTERS.search(password.lower()):
+        return '密码不能包含连续字母'
+    return None
+
+
 
 # ===== 请求模型 =====
 
@@ -37,32 +73,9 @@ class UserRegister(BaseModel):
     @validator('password')
     def validate_password_strength(cls, v):
         """验证密码强度"""
-        # 检查大写字母
-        if not re.search(r'[A-Z]',v):
-            raise ValueError('密码必须包含一个至少一个大写字母')
-
-        # 检查小写字母
-        if not re.search(r'[a-z]',v):
-            raise ValueError('密码必须包含至少一个小写字母')
-
-        # 检查数字
-        if not re.search(r'\d',v):
-            raise ValueError('密码必须包含至少一个数字')
-
-        # 检查特殊字符
-        if not re.search(r'[!@#$%^&*(),.?":{}|<>]', v):
-            raise ValueError('密码必须包含至少一个特殊字符(!@#$%^&*等)')
-
-        # 检查连续字符
-        if re.search(r'(.)\1{2,}',v):
-            raise ValueError('密码不能包含3个以上连续相同字符')
-
-        if re.search(r'(012|123|234|345|456|567|678|789)', v):
-            raise ValueError('密码不能包含连续数字')
-
-        if re.search(r'(abc|bcd|cde|def|efg|fgh|ghi|hij|ijk|jkl|klm|lmn|mno|nop|opq|pqr|qrs|rst|stu|tuv|uvw|vwx|wxy|xyz)', v.lower()):
-            raise ValueError('密码不能包含连续字母')
-        
+        error = check_password_policy(v)
+        if error:
+            raise ValueError(error)
         return v 
 
     # 新增：邮箱域名验证
@@ -128,5 +141,11 @@ class TokenResponse(BaseModel):
     access_token: str
     token_type: str
     expires_in: int 
+    refresh_token: Optional[str] = None
+    refresh_expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    """刷新token请求模型"""
+    refresh_token: str = Field(..., min_length=20, max_length=200, description="刷新令牌")
 
 
@@ -0,0 +1,127 @@
+# v7_jwt/stats.py
+"""
+探针与统计
+- 就绪检查：SELECT 1 的结果缓存 READY_CACHE_SECONDS 秒，并发的探针合并为一次查询
+- 统计数据：用户数、文章数由后台任务定期刷新，/stats 和 /health 只读取内存中的快照，
+  探针和监控再频繁也不会对数据库做全表统计
+- 探针请求在最外层的 ProbeMiddleware 中直接处理，不经过日志、准入控制等中间件
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import crud
+from cache import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# 统计数据的刷新间隔（秒）
+STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "30"))
+# 就绪检查结果的缓存时间（秒）
+READY_CACHE_SECONDS = float(os.getenv("READY_CACHE_SECONDS", "1"))
+# 就绪检查等待数据库的最长时间（秒）
+READY_TIMEOUT_SECONDS = float(os.getenv("READY_TIMEOUT_SECONDS", "2"))
+
+
+class ReadinessCheck:
+    """数据库就绪检查
+
+    从连接池取一个连接执行 SELECT 1：连接池耗尽、数据库不可用时返回False。
+    结果缓存 ttl 秒，多个探针同时到达时只查询一次
+    """
+
+    def __init__(self, engine, ttl: float = READY_CACHE_SECONDS, timeout: float = READY_TIMEOUT_SECONDS):
+        self._engine = engine
+        self.ttl = ttl
+        self._flight = SingleFlight(timeout=timeout)
+        self._ready = False
+        self._checked_at = float("-inf")
+        self.stats = {"checks": 0, "queries": 0, "failures": 0}
+
+    async def check(self) -> bool:
+        self.stats["checks"] += 1
+        if time.monotonic() - self._checked_at < self.ttl:
+            return self._ready
+        try:
+            return await self._flight.do("ready", self._ping)
+        except asyncio.TimeoutError:
+            logger.warning("就绪检查超时")
+            return False
+
+    async def _ping(self) -> bool:
+        self.stats["queries"] += 1
+        try:
+            async with self._engine.connect() as conn:
+                await conn.exec_driver_sql("SELECT 1")
+            ready = True
+        except Exception as e:
+            self.stats["failures"] += 1
+            logger.error("就绪检查失败：%s", e)
+            ready = False
+        self._ready = ready
+        self._checked_at = time.monotonic()
+        return ready
+
+
+class ProbeMiddleware:
+    """探针短路中间件（纯ASGI）
+
+    注册在所有中间件之外，探针路径直接调用对应的处理函数并返回响应：
+    kubelet每隔几秒探测一次，不需要逐层经过日志（每次两行INFO）、准入控制、CORS和路由依赖
+    """
+
+    def __init__(self, app, probes: Dict[str, Callable[[], Awaitable]]):
+        self.app = app
+        self.probes = probes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            probe = self.probes.get(scope["path"])
+            if probe is not None:
+                response = await probe()
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class StatsSnapshot:
+    """最近一次刷新得到的统计数据"""
+
+    def __init__(self):
+        self.users_count: Optional[int] = None
+        self.posts_count: Optional[int] = None
+        self.updated_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "users_count": self.users_count,
+            "posts_count": self.posts_count,
+            "stats_updated_at": self.updated_at,
+            "stats_error": self.error,
+        }
+
+
+async def refresh_stats(snapshot: StatsSnapshot, session_factory) -> None:
+    """查询数据库，更新统计快照"""
+    async with session_factory() as db:
+        users_count = await crud.get_user_count(db)
+        posts_count = await crud.get_post_count(db)
+    snapshot.users_count = users_count
+    snapshot.posts_count = posts_count
+    snapshot.updated_at = time.time()
+    snapshot.error = None
+
+
+async def watch_stats(snapshot: StatsSnapshot, session_factory, interval: float = STATS_REFRESH_SECONDS) -> None:
+    """后台任务：定期刷新统计数据；失败时保留上一次的数据并记录错误"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_stats(snapshot, session_factory)
+        except Exception as e:
+            snapshot.error = str(e)
+            logger.error("刷新统计数据失败：%s", e)
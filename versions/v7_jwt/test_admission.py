@@ -0,0 +1,117 @@
+# test_admission.py
+import asyncio
+
+from admission import AdmissionController, PRIORITY_HEALTH, PRIORITY_AUTH, PRIORITY_DEFAULT, PRIORITY_SEARCH
+
+
+def test_limits_concurrency():
+    """同时处理的请求数不超过上限，其余排队后依次处理"""
+    async def run():
+        controller = AdmissionController(max_concurrent=2, max_queue=10, queue_timeout=1)
+        running = 0
+        peak = 0
+
+        async def request():
+            nonlocal running, peak
+            assert await controller.acquire()
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            controller.release()
+
+        await asyncio.gather(*[request() for _ in range(8)])
+        assert peak == 2
+        assert controller.in_flight == 0 and controller.queue_depth == 0
+        assert controller.stats["max_queue_depth"] == 6
+
+    asyncio.run(run())
+
+
+def test_priority_order_and_shedding():
+    """空位按优先级分配；队列满时低优先级请求被挤出，同级或更低的新请求被拒绝"""
+    async def run():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=1)
+        assert await controller.acquire()  # 占住唯一的名额
+        order = []
+
+        async def request(name, priority):
+            admitted = await controller.acquire(priority)
+            order.append((name, admitted))
+            if admitted:
+                controller.release()
+
+        search = asyncio.create_task(request("search", PRIORITY_SEARCH))
+        normal = asyncio.create_task(request("normal", PRIORITY_DEFAULT))
+        await asyncio.sleep(0)
+        late_search = asyncio.create_task(request("late_search", PRIORITY_SEARCH))
+        auth = asyncio.create_task(request("auth", PRIORITY_AUTH))
+        health = asyncio.create_task(request("health", PRIORITY_HEALTH))
+        await asyncio.sleep(0)
+
+        controller.release()
+        await asyncio.gather(search, normal, late_search, auth, health)
+        assert ("late_search", False) in order
+        assert ("search", False) in order  # 被auth挤出
+        assert ("normal", False) in order  # 被health挤出
+        assert [name for name, admitted in order if admitted] == ["health", "auth"]
+        assert controller.stats["shed"] == 3
+        assert controller.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_queue_timeout_and_cancel():
+    """排队超时返回False；排队时被取消不会泄漏名额"""
+    async def run():
+        controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout=0.05)
+        assert await controller.acquire()
+        assert not await controller.acquire()
+        assert controller.stats["timeouts"] == 1
+
+        controller.queue_timeout = 5
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert controller.queue_depth == 0
+
+        controller.release()
+        assert controller.in_flight == 0
+        assert await controller.acquire()
+
+    asyncio.run(run())
+
+
+def benchmark():
+    """过载时的延迟：准入控制让被接受的请求延迟保持稳定，多出的请求立即失败"""
+    async def run(limit):
+        controller = AdmissionController(max_concurrent=limit, max_queue=limit, queue_timeout=0.5)
+        latencies = []
+        shed = 0
+
+        async def request():
+            nonlocal shed
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            if not await controller.acquire():
+                shed += 1
+                return
+            await asyncio.sleep(0.01)  # 模拟数据库
+            controller.release()
+            latencies.append(loop.time() - start)
+
+        await asyncio.gather(*[request() for _ in range(2000)])
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"并发上限{limit}：完成 {len(latencies)}，拒绝 {shed}，p99延迟 {p99 * 1000:.0f}ms")
+
+    for limit in (16, 64):
+        asyncio.run(run(limit))
+
+
+if __name__ == "__main__":
+    test_limits_concurrency()
+    test_priority_order_and_shedding()
+    test_queue_timeout_and_cancel()
+    benchmark()
@@ -0,0 +1,194 @@
+# test_cache.py
+import asyncio
+import time
+
+import crud
+from cache import SingleFlight, IdPresenceSet, TTLCache
+from conftest import temp_database
+from deadline import check_deadline, get_deadline, set_deadline
+from models import User
+
+
+def test_single_flight_shares_one_load():
+    """并发的相同读取只执行一次加载"""
+    async def run():
+        flight = SingleFlight(timeout=1.0)
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"id": 1}
+
+        results = await asyncio.gather(*[flight.do(1, loader) for _ in range(100)])
+        assert calls == 1
+        assert all(r is results[0] for r in results)
+        print(f"100个并发请求，实际加载 {calls} 次")
+
+    asyncio.run(run())
+
+
+def test_single_flight_propagates_errors():
+    """加载失败时所有等待者收到同一个异常，且下次调用会重新加载"""
+    async def run():
+        flight = SingleFlight(timeout=1.0)
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("数据库错误")
+
+        results = await asyncio.gather(
+            *[flight.do("k", failing) for _ in range(10)], return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+        async def ok():
+            return "ok"
+
+        assert await flight.do("k", ok) == "ok"
+
+    asyncio.run(run())
+
+
+def test_single_flight_ignores_leader_deadline():
+    """共享的加载不继承领头请求的截止时间：领头请求快超时也不会让等待者失败"""
+    async def run():
+        flight = SingleFlight(timeout=1.0)
+
+        async def loader():
+            await asyncio.sleep(0.02)
+            check_deadline()
+            return get_deadline()
+
+        async def leader():
+            set_deadline(0.001)
+            return await flight.do(1, loader)
+
+        async def follower():
+            await asyncio.sleep(0)
+            return await flight.do(1, loader)
+
+        assert await asyncio.gather(leader(), follower()) == [None, None]
+        assert flight.stats["loads"] == 1
+
+    asyncio.run(run())
+
+
+def test_single_flight_timeout():
+    """等待超时抛出 TimeoutError"""
+    async def run():
+        flight = SingleFlight(timeout=0.05)
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        try:
+            await flight.do("slow", slow)
+        except asyncio.TimeoutError:
+            print("超时正确抛出")
+        else:
+            raise AssertionError("应当超时")
+
+    asyncio.run(run())
+
+
+def test_id_presence_set():
+    """位图：已知范围内的缺失id判定为不存在，新id和超出范围的id照常查询"""
+    ids = IdPresenceSet()
+    assert ids.might_exist(1)  # 未加载前全部放行
+
+    ids.load([1, 2, 5, 100])
+    assert ids.might_exist(5)
+    assert not ids.might_exist(3)
+    assert not ids.might_exist(0)
+    assert not ids.might_exist(-1)
+    assert ids.might_exist(101)  # 超出已知范围：可能是其他进程新建的
+
+    ids.add(3)  # 新建文章占用了之前没见过的id
+    assert ids.might_exist(3)
+    ids.add(5000)
+    assert ids.might_exist(5000)
+    assert ids.might_exist(4999)  # 不连续的id不推进已知范围
+    print(f"负缓存命中 {ids.stats['negative_hits']} 次")
+
+
+def test_id_presence_set_multiple_writers():
+    """多个worker：其他worker新建的id不会因为本worker见过更大的id而被误判为不存在"""
+    worker_a = IdPresenceSet()
+    worker_b = IdPresenceSet()
+    worker_a.load(range(1, 101))
+    worker_b.load(range(1, 101))
+
+    # worker_b 新建了 101、102；worker_a 之后新建 103，又读到了 104
+    worker_b.add(101)
+    worker_b.add(102)
+    worker_a.add(103)
+    worker_a.add(104)
+    assert worker_a.might_exist(101) and worker_a.might_exist(102)
+    assert worker_a.max_id == 100
+
+    # worker_a 查到了 101、102：已知范围连续推进到 104
+    worker_a.add(101)
+    worker_a.add(102)
+    assert worker_a.max_id == 104
+    assert worker_b.max_id == 102
+    assert worker_a.might_exist(105)
+
+
+def test_id_presence_set_deleted_max_id_not_reused(database):
+    """删除最大id后其他进程新建数据：AUTOINCREMENT 不复用已知范围内的id，不会被误判为不存在"""
+    async def run():
+        async with database.sessions() as (_, Session):
+            async with Session() as db:
+                db.add(User(username="robin", email="robin@qq.com", hashed_password="0" * 64))
+                await db.commit()
+                await crud.bulk_create_posts(
+                    db, [{"title": f"文章{i}", "content": "内容", "author_id": 1} for i in range(60)]
+                )
+                for post_id in range(51, 60):
+                    assert await crud.delete_post(db, post_id)
+
+                worker_a, worker_b = IdPresenceSet(), IdPresenceSet()
+                worker_a.load(await crud.get_all_post_ids(db))
+                worker_b.load(await crud.get_all_post_ids(db))
+                assert worker_a.max_id == 60 and not worker_a.might_exist(55)
+
+                # 进程B删除最大id的文章后新建文章
+                assert await crud.delete_post(db, 60)
+                post = await crud.create_post(db, "新文章", "内容", 1)
+                worker_b.add(post.id)
+                assert post.id == 61
+                assert worker_a.might_exist(post.id)
+                assert (await crud.get_post_by_id(db, post.id)).title == "新文章"
+
+    asyncio.run(run())
+
+
+def test_ttl_cache():
+    """TTL缓存：过期后失效，超出容量淘汰最早的条目"""
+    cache = TTLCache(ttl=0.05, max_size=2)
+    cache.set(1, "a")
+    assert cache.get(1) == "a"
+    time.sleep(0.06)
+    assert cache.get(1) is None
+
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.set(3, "c")
+    assert cache.get(1) is None
+    assert cache.get(2) == "b" and cache.get(3) == "c"
+    cache.pop(2)
+    assert cache.get(2) is None
+
+
+if __name__ == "__main__":
+    test_single_flight_shares_one_load()
+    test_single_flight_propagates_errors()
+    test_single_flight_ignores_leader_deadline()
+    test_single_flight_timeout()
+    test_id_presence_set()
+    test_id_presence_set_multiple_writers()
+    with temp_database() as database:
+        test_id_presence_set_deleted_max_id_not_reused(database)
+    test_ttl_cache()
@@ -0,0 +1,67 @@
+# test_deadline.py
+import asyncio
+import time
+
+from sqlalchemy import text
+
+from conftest import temp_database
+from deadline import DeadlineExceeded, check_deadline, install_sqlite_deadline, remaining, set_deadline
+
+# 递归CTE：不读表也能让SQLite长时间运行
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000000) "
+    "SELECT count(*) FROM c"
+)
+
+
+def test_set_deadline_keeps_earliest():
+    """多层依赖设置截止时间时保留最早的那个"""
+    async def run():
+        assert remaining() is None
+        set_deadline(10)
+        set_deadline(1)
+        set_deadline(5)
+        assert 0 < remaining() <= 1
+        check_deadline()
+        set_deadline(-1)
+        try:
+            check_deadline()
+        except DeadlineExceeded:
+            pass
+        else:
+            raise AssertionError("应该超时")
+
+    asyncio.run(run())
+
+
+def test_query_interrupted(database):
+    """超过截止时间的查询被中断，连接之后可以继续使用"""
+    async def run():
+        async with database.engine(pool_size=1, max_overflow=0) as engine:
+            install_sqlite_deadline(engine.sync_engine)
+
+            async def request():
+                set_deadline(0.2)
+                start = time.monotonic()
+                try:
+                    async with engine.connect() as conn:
+                        await conn.execute(SLOW_QUERY)
+                except DeadlineExceeded:
+                    return time.monotonic() - start
+                raise AssertionError("查询应该被中断")
+
+            # 每个请求在独立的Task（独立的上下文）中执行
+            elapsed = await asyncio.create_task(request())
+            assert elapsed < 1
+
+            # 同一个连接，没有截止时间的查询不受影响
+            async with engine.connect() as conn:
+                assert (await conn.execute(text("SELECT 1"))).scalar() == 1
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_set_deadline_keeps_earliest()
+    with temp_database() as database:
+        test_query_interrupted(database)
@@ -0,0 +1,181 @@
+# test_jwt_codec.py
+import json
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+from jose import jwt
+
+from jwt_codec import DEFAULT_KID, HS256Codec, KeyRing, InvalidTokenError, ExpiredTokenError, b64url_encode, load_key_ring
+
+SECRET = "your-secret-key"
+CLAIMS = {
+    "sub": "42", "ver": 0, "username": "路飞", "email": "luffy@qq.com",
+    "created_at": "2024-01-01T00:00:00", "jti": "abc123", "sid": "f" * 32,
+}
+
+
+def expect_invalid(codec, token, error=InvalidTokenError):
+    try:
+        codec.decode(token)
+    except error:
+        return
+    raise AssertionError(f"应当拒绝: {token}")
+
+
+def test_interoperable_with_jose():
+    """与python-jose互相签发和验证"""
+    codec = HS256Codec(SECRET)
+    claims = dict(CLAIMS, exp=int(time.time()) + 600)
+
+    ours = codec.encode(claims)
+    assert jwt.decode(ours, SECRET, algorithms=["HS256"]) == claims
+    theirs = jwt.encode(claims, SECRET, algorithm="HS256")
+    assert codec.decode(theirs) == claims
+    # 头部字段顺序不同的token也能验证
+    reordered = jwt.encode(claims, SECRET, algorithm="HS256", headers={"kid": "k1"})
+    assert codec.decode(reordered) == claims
+
+
+def test_rejects_bad_tokens():
+    """签名错误、篡改、过期、未生效、算法不符都被拒绝"""
+    codec = HS256Codec(SECRET)
+    now = int(time.time())
+    token = codec.encode(dict(CLAIMS, exp=now + 600))
+    header, payload, signature = token.split(".")
+
+    expect_invalid(HS256Codec("other-key"), token)
+    forged = b64url_encode(b'{"sub":"1"}').decode()
+    expect_invalid(codec, f"{header}.{forged}.{signature}")
+    expect_invalid(codec, f"{header}.{payload}.{signature}x")
+    expect_invalid(codec, f"{header}.{payload}")
+    expect_invalid(codec, "不是token")
+    expect_invalid(codec, codec.encode(dict(CLAIMS, exp=now - 1)), ExpiredTokenError)
+    expect_invalid(codec, codec.encode(dict(CLAIMS, nbf=now + 600)), ExpiredTokenError)
+    expect_invalid(codec, codec.encode(dict(CLAIMS, exp="tomorrow")))
+    expect_invalid(codec, jwt.encode(CLAIMS, SECRET, algorithm="HS512"))
+    none_header = b64url_encode(b'{"alg":"none","typ":"JWT"}').decode()
+    expect_invalid(codec, f"{none_header}.{payload}.")
+
+
+def test_verified_cache_still_checks_expiry():
+    """缓存过的token过期后同样被拒绝"""
+    codec = HS256Codec(SECRET, cache_size=2)
+    now = int(time.time())
+    token = codec.encode(dict(CLAIMS, exp=now + 10))
+    assert codec.decode(token, now=now)["sub"] == "42"
+    try:
+        codec.decode(token, now=now + 11)
+    except ExpiredTokenError:
+        pass
+    else:
+        raise AssertionError("缓存的token过期后应当被拒绝")
+    for i in range(3):
+        codec.decode(codec.encode(dict(CLAIMS, jti=str(i), exp=now + 10)), now=now)
+    assert len(codec._verified) == 2
+
+
+def test_key_rotation(tmp_path):
+    """密钥轮换：新token带新kid，旧kid在过渡期内仍可验证，过期后拒绝"""
+    now = int(time.time())
+    claims = dict(CLAIMS, exp=now + 600)
+    old_ring = KeyRing({"k1": "old-secret"}, active_kid="k1")
+    old_token = old_ring.encode(claims)
+    legacy_token = HS256Codec("old-secret").encode(claims)  # 密钥环之前签发，没有kid
+
+    path = tmp_path / "keys.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "active": "k2",
+            "legacy": "k1",
+            "keys": {"k2": "new-secret", "k1": {"secret": "old-secret", "verify_until": now + 60}},
+        }, f)
+    ring = load_key_ring(path)
+
+    new_token = ring.encode(claims)
+    assert jwt.get_unverified_header(new_token)["kid"] == "k2"
+    assert jwt.decode(new_token, "new-secret", algorithms=["HS256"]) == claims
+    assert ring.decode(new_token) == claims
+    assert ring.decode(old_token) == claims
+    assert ring.decode(legacy_token) == claims
+    # 其他库用kid签发的token也能验证
+    assert ring.decode(jwt.encode(claims, "new-secret", algorithm="HS256", headers={"kid": "k2"})) == claims
+
+    expect_invalid(ring, jwt.encode(claims, "new-secret", algorithm="HS256", headers={"kid": "k9"}))
+    # kid指向的密钥和签名用的密钥不一致
+    expect_invalid(ring, jwt.encode(claims, "old-secret", algorithm="HS256", headers={"kid": "k2"}))
+    # kid不是字符串：按格式错误拒绝，而不是抛出 TypeError
+    payload = b64url_encode(json.dumps(claims).encode()).decode()
+    for kid in ([1], {"k": "k2"}, 2):
+        header = b64url_encode(json.dumps({"alg": "HS256", "kid": kid}).encode()).decode()
+        expect_invalid(ring, f"{header}.{payload}.c2lnbmF0dXJl")
+    try:
+        ring.decode(old_token, now=now + 61)
+    except InvalidTokenError:
+        pass
+    else:
+        raise AssertionError("过渡期结束后旧密钥签发的token应当被拒绝")
+
+
+
+def test_first_rotation_from_default_key(tmp_path):
+    """第一次轮换：未配置密钥文件时签发的token（kid为default）由密钥文件中的 legacy 密钥验证"""
+    now = int(time.time())
+    claims = dict(CLAIMS, exp=now + 600)
+    default_ring = KeyRing({DEFAULT_KID: "old-secret"}, active_kid=DEFAULT_KID)
+    old_token = default_ring.encode(claims)
+    assert jwt.get_unverified_header(old_token)["kid"] == DEFAULT_KID
+
+    path = tmp_path / "keys.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "active": "2024-06",
+            "legacy": "2024-01",
+            "keys": {"2024-06": "new-secret", "2024-01": {"secret": "old-secret", "verify_until": now + 60}},
+        }, f)
+    ring = load_key_ring(path)
+    assert ring.decode(old_token) == claims
+    assert ring.decode(ring.encode(claims)) == claims
+    # 签名密钥不是 legacy 密钥的default token仍然拒绝
+    expect_invalid(ring, KeyRing({DEFAULT_KID: "other-secret"}, active_kid=DEFAULT_KID).encode(claims))
+    # legacy 密钥过渡期结束后拒绝
+    try:
+        ring.decode(old_token, now=now + 61)
+    except InvalidTokenError:
+        pass
+    else:
+        raise AssertionError("过渡期结束后旧密钥签发的token应当被拒绝")
+
+
+def benchmark():
+    """签名/验签吞吐量：python-jose vs 专用编解码器"""
+    codec = HS256Codec(SECRET)
+    uncached = HS256Codec(SECRET, cache_size=0)
+    claims = dict(CLAIMS, exp=int(time.time()) + 600)
+    token = codec.encode(claims)
+    ring = KeyRing({f"k{i}": f"secret-{i}" for i in range(5)}, active_kid="k4")
+    ring_token = ring.encode(claims)
+    n = 20000
+    cases = [
+        ("python-jose 签名", lambda: jwt.encode(claims, SECRET, algorithm="HS256")),
+        ("HS256Codec 签名", lambda: codec.encode(claims)),
+        ("python-jose 验签", lambda: jwt.decode(token, SECRET, algorithms=["HS256"])),
+        ("HS256Codec 验签（无缓存）", lambda: uncached.decode(token)),
+        ("HS256Codec 验签（已验证过的token）", lambda: codec.decode(token)),
+        ("KeyRing 验签（已验证过的token）", lambda: ring.decode(ring_token)),
+    ]
+    for name, func in cases:
+        seconds = timeit.timeit(func, number=n)
+        print(f"{name}: {n / seconds:,.0f} tokens/s ({seconds / n * 1e6:.1f}µs)")
+
+
+if __name__ == "__main__":
+    test_interoperable_with_jose()
+    test_rejects_bad_tokens()
+    test_verified_cache_still_checks_expiry()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_key_rotation(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_first_rotation_from_default_key(Path(tmp))
+    benchmark()
@@ -0,0 +1,66 @@
+# test_lazy_session.py
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from conftest import temp_database
+from database import LazySession, session_metrics
+
+
+def test_unused_session_not_created(database):
+    """没有访问过的会话不创建，也不占用连接"""
+    async def run():
+        async with database.engine() as engine:
+            Session = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+            before = session_metrics()
+
+            unused = LazySession(Session)
+            await unused.close()
+            assert not unused.started
+            assert engine.pool.checkedout() == 0
+
+            used = LazySession(Session)
+            assert (await used.execute(text("SELECT 1"))).scalar() == 1
+            assert used.started
+            await used.close()
+            assert engine.pool.checkedout() == 0
+
+            after = session_metrics()
+            assert after["requests"] - before["requests"] == 2
+            assert after["opened"] - before["opened"] == 1
+            assert after["unused"] - before["unused"] == 1
+
+    asyncio.run(run())
+
+
+def benchmark():
+    """不访问数据库的请求：创建并关闭会话 vs 惰性会话"""
+    async def run(database):
+        async with database.engine() as engine:
+            Session = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+            async def eager():
+                async with Session() as session:
+                    await session.close()
+
+            async def lazy():
+                session = LazySession(Session)
+                await session.close()
+
+            n = 20000
+            loop = asyncio.get_running_loop()
+            for name, func in (("AsyncSession", eager), ("LazySession", lazy)):
+                start = loop.time()
+                for _ in range(n):
+                    await func()
+                print(f"{name}: {(loop.time() - start) / n * 1e6:.1f}µs/请求")
+
+    with temp_database() as database:
+        asyncio.run(run(database))
+
+
+if __name__ == "__main__":
+    with temp_database() as database:
+        test_unused_session_not_created(database)
+    benchmark()
@@ -0,0 +1,102 @@
+# test_moderation.py
+import os
+import random
+import tempfile
+import time
+from moderation import (
+    BannedWordMatcher, DEFAULT_BANNED_WORDS,
+    find_banned_word, set_banned_words, reload_if_changed
+)
+
+
+def naive_find(words, text):
+    """原实现：对每个敏感词做一次子串查找"""
+    text = text.lower()
+    for word in words:
+        if word in text:
+            return word
+    return None
+
+
+def random_words(rng, count, alphabet):
+    return list({"".join(rng.choice(alphabet) for _ in range(rng.randint(2, 4))) for _ in range(count)})
+
+
+def test_matcher_agrees_with_naive_scan():
+    """匹配结果与逐词查找一致（是否命中一致，命中的词确实出现在文本中）"""
+    rng = random.Random(42)
+    alphabet = "abcdeABC黑白茶胡子"
+    for _ in range(2000):
+        words = random_words(rng, rng.randint(1, 8), alphabet)
+        text = "".join(rng.choice(alphabet + "xyz ") for _ in range(rng.randint(0, 30)))
+        found = BannedWordMatcher(words).find(text.lower())
+        expected = naive_find([w.lower() for w in words], text)
+        assert (found is None) == (expected is None), (words, text)
+        if found is not None:
+            assert found in text.lower()
+
+
+def test_default_words_and_swap():
+    """默认词表生效，替换词表后立即使用新词表"""
+    assert find_banned_word("这是一篇关于黑胡子的文章") == "黑胡子"
+    assert find_banned_word("普通内容") is None
+    try:
+        set_banned_words(["Spam"])
+        assert find_banned_word("buy SPAM now") == "spam"
+        assert find_banned_word("黑胡子") is None
+    finally:
+        set_banned_words(DEFAULT_BANNED_WORDS)
+
+
+def test_reload_from_file():
+    """词表文件修改后重新加载，文件未变化时不重复编译"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "banned_words.txt")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("# 注释行\n广告\n")
+            assert reload_if_changed(path)
+            assert find_banned_word("这是广告") == "广告"
+            assert find_banned_word("黑胡子") is None
+            assert not reload_if_changed(path)
+
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("刷单\n")
+            assert reload_if_changed(path)
+            assert find_banned_word("刷单返利") == "刷单"
+        finally:
+            set_banned_words(DEFAULT_BANNED_WORDS)
+
+
+def benchmark(sizes=(10, 1_000, 10_000), text_length: int = 10_000, rounds: int = 20) -> None:
+    """不同词表规模下检查一篇10000字文章的耗时"""
+    rng = random.Random(1)
+    banned_alphabet = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+    clean_alphabet = [chr(c) for c in range(0x6000, 0x6000 + 3000)]
+    clean_text = "".join(rng.choice(clean_alphabet) for _ in range(text_length))
+    # 最坏情况：文本由敏感词的字符组成，但不包含任何敏感词
+    dense_text = "".join(rng.choice(banned_alphabet[:50]) for _ in range(text_length))
+    print(f"检查 {text_length} 字文本的耗时（毫秒）")
+    for size in sizes:
+        words = [w for w in random_words(rng, size, banned_alphabet) if w not in dense_text]
+        start = time.perf_counter()
+        matcher = BannedWordMatcher(words)
+        build = time.perf_counter() - start
+        for name, text in (("普通文本", clean_text), ("密集文本", dense_text)):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                naive_find(words, text)
+            naive = (time.perf_counter() - start) / rounds
+            start = time.perf_counter()
+            for _ in range(rounds):
+                matcher.find(text.lower())
+            automaton = (time.perf_counter() - start) / rounds
+            print(f"  {size:>6} 词 {name}: 逐词查找 {naive * 1e3:8.3f}，自动机 {automaton * 1e3:8.3f}")
+        print(f"  {size:>6} 词 构建自动机 {build * 1e3:.1f} 毫秒")
+
+
+if __name__ == "__main__":
+    test_matcher_agrees_with_naive_scan()
+    test_default_words_and_swap()
+    test_reload_from_file()
+    benchmark()
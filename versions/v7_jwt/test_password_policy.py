@@ -0,0 +1,70 @@
+# test_password_policy.py
+import itertools
+import random
+import re
+import time
+from schemas import check_password_policy
+
+
+def reference_policy(v):
+    """原来的多次正则实现，作为对照"""
+    if not re.search(r'[A-Z]', v):
+        return '密码必须包含一个至少一个大写字母'
+    if not re.search(r'[a-z]', v):
+        return '密码必须包含至少一个小写字母'
+    if not re.search(r'\d', v):
+        return '密码必须包含至少一个数字'
+    if not re.search(r'[!@#$%^&*(),.?":{}|<>]', v):
+        return '密码必须包含至少一个特殊字符(!@#$%^&*等)'
+    if re.search(r'(.)\1{2,}', v):
+        return '密码不能包含3个以上连续相同字符'
+    if re.search(r'(012|123|234|345|456|567|678|789)', v):
+        return '密码不能包含连续数字'
+    if re.search(r'(abc|bcd|cde|def|efg|fgh|ghi|hij|ijk|jkl|klm|lmn|mno|nop|opq|pqr|qrs|rst|stu|tuv|uvw|vwx|wxy|xyz)', v.lower()):
+        return '密码不能包含连续字母'
+    return None
+
+
+# 覆盖所有规则边界的字符：大小写字母及连续字母、数字及连续数字、特殊字符、
+# 换行、全角数字、小写后变成多个字符的İ、小写后是k的开尔文符号K
+ALPHABET = "aAbBcjkKz0129!\n１İK"
+
+
+def test_exhaustive_equivalence():
+    """字母表上长度不超过5的所有字符串，结果与原实现完全一致"""
+    checked = 0
+    for length in range(6):
+        for chars in itertools.product(ALPHABET, repeat=length):
+            password = "".join(chars)
+            assert check_password_policy(password) == reference_policy(password), repr(password)
+            checked += 1
+    print(f"穷举检查 {checked:,} 个字符串")
+
+
+def test_random_equivalence():
+    """随机长密码（包含任意Unicode字符）结果一致"""
+    rng = random.Random(7)
+    pool = ALPHABET + "xyzXYZ345678@#$%^&*()Σσς ß€中文"
+    for _ in range(50_000):
+        password = "".join(rng.choice(pool) for _ in range(rng.randint(0, 40)))
+        assert check_password_policy(password) == reference_policy(password), repr(password)
+    for _ in range(20_000):
+        password = "".join(chr(rng.randrange(0x110000)) for _ in range(rng.randint(0, 12)))
+        password = password.encode("utf-8", "replace").decode("utf-8", "replace")
+        assert check_password_policy(password) == reference_policy(password), repr(password)
+
+
+def benchmark(rounds: int = 200_000) -> None:
+    """注册时密码校验的耗时"""
+    samples = ["MyPass136!", "Xk9!mPq2zR#t", "weakpassword", "Abcdef12!", "P@ssw0rdP@ssw0rd2024"]
+    for name, func in (("原实现(多次正则)", reference_policy), ("预编译检查", check_password_policy)):
+        start = time.perf_counter()
+        for i in range(rounds):
+            func(samples[i % len(samples)])
+        print(f"{name}: {(time.perf_counter() - start) / rounds * 1e6:.2f} 微秒/次")
+
+
+if __name__ == "__main__":
+    test_exhaustive_equivalence()
+    test_random_equivalence()
+    benchmark()
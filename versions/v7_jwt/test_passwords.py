@@ -0,0 +1,138 @@
+# test_passwords.py
+import asyncio
+import hashlib
+import time
+
+import crud
+import passwords
+from conftest import temp_database
+from models import User
+from passwords import (
+    HashingPool, HashingOverloaded, hash_password, verify_password,
+    hash_password_sync, verify_password_sync, needs_rehash,
+)
+
+
+def test_hash_and_verify():
+    """scrypt哈希：格式、长度、加盐、校验"""
+    stored = hash_password_sync("Xk9!mPq2z")
+    assert stored.startswith("scrypt$")
+    assert len(stored) <= 100  # hashed_password 列是 String(100)
+    assert stored != hash_password_sync("Xk9!mPq2z")  # 每次随机盐
+    assert verify_password_sync("Xk9!mPq2z", stored)
+    assert not verify_password_sync("Xk9!mPq2Z", stored)
+    assert not verify_password_sync("Xk9!mPq2z", "scrypt$坏数据")
+    assert not needs_rehash(stored)
+
+
+def test_legacy_sha256():
+    """旧版sha256哈希仍能校验，并被标记为需要升级"""
+    legacy = hashlib.sha256("Xk9!mPq2z".encode()).hexdigest()
+    assert verify_password_sync("Xk9!mPq2z", legacy)
+    assert not verify_password_sync("wrong", legacy)
+    assert needs_rehash(legacy)
+
+
+def test_pool_rejects_when_full():
+    """超过 workers + max_pending 的任务直接拒绝"""
+    async def run():
+        pool = HashingPool(workers=1, max_pending=2)
+        results = await asyncio.gather(
+            *[pool.run(time.sleep, 0.05) for _ in range(5)], return_exceptions=True
+        )
+        rejected = [r for r in results if isinstance(r, HashingOverloaded)]
+        assert len(rejected) == 2
+        assert pool.stats["completed"] == 3
+        assert pool.stats["max_queue_depth"] == 2
+        assert pool.stats["in_flight"] == 0 and pool.stats["queued"] == 0
+        pool.shutdown()
+
+    asyncio.run(run())
+
+
+def test_cancelled_queued_job_releases_slot():
+    """排队中的请求被取消后归还名额，不会让线程池永久处于"已满"状态"""
+    async def run():
+        pool = HashingPool(workers=1, max_pending=1)
+        running = asyncio.ensure_future(pool.run(time.sleep, 0.1))
+        await asyncio.sleep(0.01)
+        queued = asyncio.ensure_future(pool.run(time.sleep, 0.1))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        await running
+        assert pool.stats["queued"] == 0 and pool.stats["in_flight"] == 0
+        assert pool.stats["completed"] == 1
+        # 名额已归还，新任务可以正常执行
+        await asyncio.gather(pool.run(time.sleep, 0), pool.run(time.sleep, 0))
+        pool.shutdown()
+
+    asyncio.run(run())
+
+
+def test_event_loop_not_blocked():
+    """哈希期间事件循环仍能及时调度其他协程"""
+    async def run():
+        lags = []
+
+        async def ticker(stop):
+            while not stop.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lags.append(time.perf_counter() - start - 0.005)
+
+        stop = asyncio.Event()
+        task = asyncio.create_task(ticker(stop))
+        stored = await asyncio.gather(*[hash_password(f"pw{i}") for i in range(8)])
+        assert all(await asyncio.gather(*[verify_password(f"pw{i}", s) for i, s in enumerate(stored)]))
+        stop.set()
+        await task
+        print(f"16次scrypt期间事件循环最大延迟: {max(lags) * 1000:.1f}ms")
+        assert max(lags) < 0.05
+
+    asyncio.run(run())
+
+
+def test_unknown_account_costs_one_hash(database):
+    """账号不存在和密码错误一样，都在线程池里校验一次scrypt"""
+    async def run():
+        stats = passwords.get_pool().stats
+        async with database.sessions() as (_, Session):
+            async with Session() as db:
+                db.add(User(username="robin", email="robin@qq.com", hashed_password=hash_password_sync("Xk9!mPq2z")))
+                await db.commit()
+                for account in ("nobody", "nobody@qq.com", "robin"):
+                    completed = stats["completed"]
+                    assert await crud.authenticate_user(db, account, "wrong-password") is None
+                    assert stats["completed"] == completed + 1
+
+    asyncio.run(run())
+
+
+def benchmark():
+    """单次哈希耗时，以及在事件循环中直接计算和放进线程池的对比"""
+    start = time.perf_counter()
+    for _ in range(10):
+        hash_password_sync("Xk9!mPq2z")
+    per_call = (time.perf_counter() - start) / 10
+    print(f"scrypt(n={passwords.SCRYPT_N}) 单次耗时: {per_call * 1000:.1f}ms")
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*[hash_password("Xk9!mPq2z") for _ in range(32)])
+        elapsed = time.perf_counter() - start
+        print(f"32次并发哈希（{passwords.PASSWORD_HASH_WORKERS}个线程）: {elapsed:.2f}秒, "
+              f"指标: {passwords.hashing_stats()}")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_hash_and_verify()
+    test_legacy_sha256()
+    test_pool_rejects_when_full()
+    test_cancelled_queued_job_releases_slot()
+    test_event_loop_not_blocked()
+    with temp_database() as database:
+        test_unknown_account_costs_one_hash(database)
+    benchmark()
@@ -0,0 +1,66 @@
+# test_pool.py
+import asyncio
+import time
+
+from conftest import temp_database
+from database import TimedQueuePool, pool_metrics, warmup_pool
+
+
+def test_warmup(database):
+    """预热后连接都在池中空闲，最多预热pool_size个"""
+    async def run():
+        async with database.engine(poolclass=TimedQueuePool, pool_size=3, max_overflow=5) as engine:
+            assert await warmup_pool(engine, 10) == 3
+            metrics = pool_metrics(engine)
+            assert metrics["idle"] == 3 and metrics["checked_out"] == 0
+            assert metrics["checkouts"] == 3
+
+    asyncio.run(run())
+
+
+def test_wait_time_recorded(database):
+    """连接用完时记录等待时间"""
+    async def run():
+        async with database.engine(poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=5) as engine:
+            conn = await engine.connect()
+
+            async def release_later():
+                await asyncio.sleep(0.1)
+                await conn.close()
+
+            releaser = asyncio.create_task(release_later())
+            async with engine.connect() as second:
+                # 拿到的是第一个请求归还的连接（pool_size=1，不允许溢出）
+                assert pool_metrics(engine)["checked_out"] == 1
+                assert (await second.exec_driver_sql("SELECT 1")).scalar() == 1
+            await releaser
+            metrics = pool_metrics(engine)
+            assert metrics["max_wait_ms"] >= 90
+            assert metrics["checked_out"] == 0
+
+    asyncio.run(run())
+
+
+def benchmark():
+    """部署后第一个请求：冷启动建连 vs 预热后"""
+    async def first_query(database, warmup):
+        async with database.engine(poolclass=TimedQueuePool, pool_size=5) as engine:
+            if warmup:
+                await warmup_pool(engine, 5)
+            start = time.perf_counter()
+            async with engine.connect() as conn:
+                await conn.exec_driver_sql("SELECT 1")
+            return time.perf_counter() - start
+
+    for warmup in (False, True):
+        with temp_database() as database:
+            elapsed = asyncio.run(first_query(database, warmup))
+        print(f"{'预热' if warmup else '冷启动'}：第一次查询 {elapsed * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    with temp_database() as database:
+        test_warmup(database)
+    with temp_database() as database:
+        test_wait_time_recorded(database)
+    benchmark()
@@ -0,0 +1,67 @@
+# test_probes.py
+import logging
+
+from fastapi.testclient import TestClient
+
+import main
+from stats import ReadinessCheck
+from test_stats import BrokenDatabase
+
+
+class FixedReadiness(ReadinessCheck):
+    """不访问数据库，直接返回给定结果的就绪检查"""
+
+    def __init__(self, ready: bool):
+        super().__init__(BrokenDatabase())
+        self._ready = ready
+        self._checked_at = float("inf")
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_probes_bypass_middlewares():
+    """探针在最外层直接返回：不写请求日志、不经过准入控制；/readyz 反映数据库状态；/health 是 /stats 的别名"""
+    # 不进入 with 块，不执行启动事件，请求不会访问数据库
+    client = TestClient(main.app)
+    records = Records()
+    logging.getLogger("main").addHandler(records)
+    admission = main.admission
+    original = main.readiness_check, admission.max_concurrent, admission.max_queue
+    try:
+        admission.max_concurrent = admission.max_queue = 0  # 准入控制拒绝所有普通请求
+        response = client.get("/livez")
+        assert response.status_code == 200 and response.text == "ok"
+        assert "x-process-time" not in response.headers
+
+        main.readiness_check = FixedReadiness(True)
+        response = client.get("/readyz")
+        assert response.status_code == 200 and response.json() == {"status": "ready"}
+
+        main.readiness_check = FixedReadiness(False)
+        response = client.get("/readyz")
+        assert response.status_code == 503 and response.json() == {"status": "not ready"}
+
+        assert not any("/livez" in m or "/readyz" in m for m in records.messages)
+        assert client.get("/stats").status_code == 503
+    finally:
+        main.readiness_check, admission.max_concurrent, admission.max_queue = original
+        logging.getLogger("main").removeHandler(records)
+
+    stats = client.get("/stats")
+    health = client.get("/health")
+    assert stats.status_code == health.status_code == 200
+    assert "x-process-time" in health.headers
+    ignored = {"admission", "db_pool", "db_sessions", "password_hashing"}  # 每次请求都会变化的计数
+    assert {k: v for k, v in health.json().items() if k not in ignored} == \
+        {k: v for k, v in stats.json().items() if k not in ignored}
+
+
+if __name__ == "__main__":
+    test_probes_bypass_middlewares()
@@ -0,0 +1,102 @@
+# test_query_cache.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy import select, or_, desc
+
+import crud
+from conftest import temp_database
+from models import User, Post
+
+
+@asynccontextmanager
+async def make_session(database, posts=200):
+    async with database.sessions() as (engine, Session):
+        async with Session() as db:
+            db.add(User(username="robin", email="Robin@QQ.com", hashed_password="0" * 64))
+            await db.commit()
+            await crud.bulk_create_posts(
+                db, [{"title": f"文章{i}", "content": "Python" if i % 10 == 0 else "内容", "author_id": 1}
+                     for i in range(posts)]
+            )
+        yield engine, Session
+
+
+def test_prebuilt_queries_match_adhoc(database):
+    """预先构建的语句和每次新建的 select() 返回相同的结果"""
+    async def run():
+        async with make_session(database) as (_, Session):
+            async with Session() as db:
+                assert (await crud.get_user_by_id(db, 1)).username == "robin"
+                assert await crud.get_user_by_id(db, 2) is None
+                assert (await crud.get_user_by_username(db, "robin")).id == 1
+                assert (await crud.get_user_by_email(db, "robin@qq.COM")).id == 1
+                assert (await crud.get_post_by_id(db, 7)).title == "文章6"
+
+                for skip, limit, keyword in ((0, 10, None), (20, 5, None), (0, 100, "Python"), (3, 4, "Python")):
+                    query = select(Post)
+                    if keyword:
+                        query = query.filter(or_(Post.title.contains(keyword), Post.content.contains(keyword)))
+                    query = query.order_by(desc(Post.created_at)).offset(skip).limit(limit)
+                    expected = [post.id for post in (await db.execute(query)).scalars().all()]
+                    actual = [post.id for post in await crud.get_posts(db, skip=skip, limit=limit, keyword=keyword)]
+                    assert actual == expected
+                assert len(await crud.get_posts(db, limit=100, keyword="Python")) == 20
+
+    asyncio.run(run())
+
+
+def benchmark():
+    """按主键查文章，逐层对比每次调用的耗时：
+    ORM每次新建 select() → ORM预先构建的语句 → Core预先构建的语句 → SQLAlchemy直接执行SQL字符串 → aiosqlite驱动
+    后两者之差是SQLAlchemy异步适配层的开销，与语句构建和编译无关
+    """
+    async def timed(name, func, n=5000):
+        for i in range(200):  # 预热编译缓存
+            await func(i % 1000 + 1)
+        start = time.perf_counter()
+        for i in range(n):
+            await func(i % 1000 + 1)
+        print(f"{name}: {(time.perf_counter() - start) / n * 1e6:.0f}µs/次")
+
+    async def run(database):
+        async with make_session(database, posts=1000) as (engine, Session):
+            sql = "SELECT id, title, content, created_at, updated_at, author_id FROM posts WHERE id = ?"
+
+            async with Session() as db:
+                async def adhoc(i):
+                    result = await db.execute(select(Post).filter(Post.id == i))
+                    return result.scalar_one_or_none()
+
+                async def prebuilt(i):
+                    return await crud.get_post_by_id(db, i)
+
+                await timed("ORM 每次新建select()", adhoc)
+                await timed("ORM 预先构建的语句", prebuilt)
+
+            async with engine.connect() as conn:
+                async def core(i):
+                    return (await conn.execute(crud._post_by_id, {"post_id": i})).first()
+
+                async def driver_sql(i):
+                    return (await conn.exec_driver_sql(sql, (i,))).first()
+
+                raw = (await conn.get_raw_connection()).driver_connection
+
+                async def driver(i):
+                    async with raw.execute(sql, (i,)) as cursor:
+                        return await cursor.fetchone()
+
+                await timed("Core 预先构建的语句", core)
+                await timed("SQLAlchemy 执行SQL字符串", driver_sql)
+                await timed("aiosqlite 驱动", driver)
+
+    with temp_database() as database:
+        asyncio.run(run(database))
+
+
+if __name__ == "__main__":
+    with temp_database() as database:
+        test_prebuilt_queries_match_adhoc(database)
+    benchmark()
@@ -0,0 +1,153 @@
+# test_query_plan.py
+"""
+检查登录查询的执行计划：
+在填充了数据的SQLite库上执行 crud.authenticate_user，记录它发出的SQL，
+再用 EXPLAIN QUERY PLAN 确认每条查询都只走一个唯一索引
+"""
+import asyncio
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+import crud
+from conftest import temp_database
+from database import _migrate
+
+SEED_USERS = 10000
+
+
+async def seed_and_capture(database, accounts):
+    """建库并填充用户，返回每个账号登录时执行的 (SQL, 参数) 和执行计划"""
+    async with database.engine(create=True) as engine:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("INSERT INTO users (username, email, email_lower, hashed_password) "
+                     "VALUES (:username, :email, :email_lower, :hashed_password)"),
+                [
+                    {
+                        "username": f"user{i}",
+                        "email": f"User{i}@qq.com",
+                        "email_lower": f"user{i}@qq.com",
+                        "hashed_password": "0" * 64,
+                    }
+                    for i in range(SEED_USERS)
+                ]
+            )
+            await conn.execute(text("ANALYZE"))
+
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                captured.append((statement, parameters))
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        Session = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+        results = {}
+        for account in accounts:
+            captured.clear()
+            async with Session() as db:
+                await crud.authenticate_user(db, account, "wrong-password")
+            plans = []
+            async with engine.connect() as conn:
+                for statement, parameters in list(captured):
+                    rows = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+                    plans.append(" | ".join(row[-1] for row in rows))
+            results[account] = plans
+
+        async with engine.connect() as conn:
+            rows = await conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT * FROM users WHERE username = ? OR email = ?",
+                ("user42", "user42"),
+            )
+            results["旧的OR查询"] = [" | ".join(row[-1] for row in rows)]
+
+        return results
+
+
+def test_login_uses_single_unique_index(database):
+    """用户名、邮箱（任意大小写）登录都只做一次索引查找，不扫描全表"""
+    results = asyncio.run(seed_and_capture(database, ["user42", "USER42@QQ.com", "user42@qq.com"]))
+    for account, plans in results.items():
+        print(f"{account}: {plans}")
+
+    assert results["user42"] == ["SEARCH users USING INDEX ix_users_username (username=?)"]
+    # 邮箱形式的账号命中 email_lower 索引，不再回退到用户名查询
+    for account in ("USER42@QQ.com", "user42@qq.com"):
+        assert results[account] == ["SEARCH users USING INDEX ix_users_email_lower (email_lower=?)"]
+    for plan in results["user42"] + results["user42@qq.com"]:
+        assert "SCAN" not in plan
+
+
+def test_migration_adds_email_lower(database):
+    """旧数据库升级：添加列、回填小写邮箱、创建唯一索引、token版本默认为0"""
+    async def run():
+        async with database.engine() as engine, engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50), "
+                "email VARCHAR(100), hashed_password VARCHAR(100), created_at DATETIME)"
+            ))
+            await conn.execute(text(
+                "INSERT INTO users (username, email, hashed_password) VALUES ('nami', 'Nami@QQ.com', 'x')"
+            ))
+            await conn.run_sync(_migrate)
+            await conn.run_sync(_migrate)  # 重复执行不报错
+            email_lower = (await conn.execute(text("SELECT email_lower FROM users"))).scalar_one()
+            indexes = (await conn.execute(text("PRAGMA index_list(users)"))).all()
+            token_version = (await conn.execute(text("SELECT token_version FROM users"))).scalar_one()
+        assert email_lower == "nami@qq.com"
+        assert any(row.name == "ix_users_email_lower" and row.unique for row in indexes)
+        assert token_version == 0
+
+    asyncio.run(run())
+
+
+
+def test_migration_enables_autoincrement(database):
+    """旧数据库升级：users/posts 重建为 AUTOINCREMENT，数据和索引保留，删除最大id后不再复用"""
+    async def run():
+        async with database.engine() as engine, engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50), "
+                "email VARCHAR(100), hashed_password VARCHAR(100), created_at DATETIME)"
+            ))
+            await conn.execute(text(
+                "CREATE TABLE posts (id INTEGER PRIMARY KEY, title VARCHAR(200), content TEXT, "
+                "created_at DATETIME, updated_at DATETIME, author_id INTEGER REFERENCES users (id))"
+            ))
+            await conn.execute(text("CREATE INDEX ix_posts_title ON posts (title)"))
+            await conn.execute(text(
+                "INSERT INTO users (username, email, hashed_password) VALUES ('nami', 'Nami@QQ.com', 'x')"
+            ))
+            await conn.execute(text(
+                "INSERT INTO posts (title, content, author_id) VALUES ('a', 'x', 1), ('b', 'x', 1), ('c', 'x', 1)"
+            ))
+            await conn.run_sync(_migrate)
+            await conn.run_sync(_migrate)  # 重复执行不报错
+
+            tables = (await conn.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name IN ('users', 'posts')"
+            ))).scalars().all()
+            titles = (await conn.execute(text("SELECT title FROM posts ORDER BY id"))).scalars().all()
+            post_indexes = (await conn.execute(text("PRAGMA index_list(posts)"))).all()
+            user_indexes = (await conn.execute(text("PRAGMA index_list(users)"))).all()
+            await conn.execute(text("DELETE FROM posts WHERE id = 3"))
+            await conn.execute(text("INSERT INTO posts (title, content, author_id) VALUES ('d', 'x', 1)"))
+            new_id = (await conn.execute(text("SELECT id FROM posts WHERE title = 'd'"))).scalar_one()
+        assert len(tables) == 2 and all("AUTOINCREMENT" in sql for sql in tables)
+        assert titles == ["a", "b", "c"]
+        assert any(row.name == "ix_posts_title" for row in post_indexes)
+        assert any(row.name == "ix_users_email_lower" and row.unique for row in user_indexes)
+        assert new_id == 4
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    with temp_database() as database:
+        test_login_uses_single_unique_index(database)
+    with temp_database() as database:
+        test_migration_adds_email_lower(database)
+    with temp_database() as database:
+        test_migration_enables_autoincrement(database)
@@ -0,0 +1,84 @@
+# test_ratelimit.py
+import timeit
+
+from ratelimit import SlidingWindowLimiter, retry_after_header
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_limit_within_window():
+    """窗口内超过次数后拒绝，等待 retry_after 秒后恢复"""
+    clock = FakeClock()
+    limiter = SlidingWindowLimiter(limit=3, window=60, clock=clock)
+    assert [limiter.hit("1.2.3.4") for _ in range(3)] == [0, 0, 0]
+    wait = limiter.hit("1.2.3.4")
+    assert wait > 0
+    assert limiter.hit("5.6.7.8") == 0  # 其他key不受影响
+
+    clock.now += wait
+    assert limiter.hit("1.2.3.4") == 0
+    assert limiter.stats["limited"] == 1
+
+
+def test_sliding_across_periods():
+    """上一段的计数按比例计入，而不是在分段边界一下子清零"""
+    clock = FakeClock(now=0.0)
+    limiter = SlidingWindowLimiter(limit=10, window=60, clock=clock)
+    clock.now = 50.0
+    for _ in range(10):
+        limiter.add("acct")
+    clock.now = 61.0  # 新的一段开始，上一段的10次仍有约98%在窗口内
+    assert limiter.retry_after("acct") > 0
+    clock.now = 115.0  # 上一段只剩约8%在窗口内
+    assert limiter.retry_after("acct") == 0
+
+
+def test_old_periods_are_dropped():
+    """超过两个时间段没有活动的key整体丢弃"""
+    clock = FakeClock(now=0.0)
+    limiter = SlidingWindowLimiter(limit=5, window=10, clock=clock)
+    for i in range(1000):
+        limiter.add(f"ip{i}")
+    assert len(limiter) == 1000
+    clock.now = 25.0
+    limiter.add("new")
+    assert len(limiter) == 1
+
+
+def test_zero_limit_rejects_everything():
+    """限额为0时全部拒绝，等待时间为一个窗口"""
+    clock = FakeClock(now=0.0)
+    limiter = SlidingWindowLimiter(limit=0, window=60, clock=clock)
+    assert limiter.hit("ip") == 60
+    clock.now = 90.0
+    assert limiter.hit("ip") == 60
+    assert len(limiter) == 0 and limiter.stats["limited"] == 2
+
+
+def test_retry_after_header():
+    assert retry_after_header(0.2) == "1"
+    assert retry_after_header(59.01) == "60"
+
+
+def benchmark():
+    limiter = SlidingWindowLimiter(limit=20, window=60)
+    for i in range(100000):
+        limiter.add(f"10.0.{i // 256}.{i % 256}")
+    n = 200000
+    seconds = timeit.timeit(lambda: limiter.hit("10.0.0.1"), number=n)
+    print(f"{len(limiter)}个key，单次检查+计数 {seconds / n * 1e9:.0f}ns")
+
+
+if __name__ == "__main__":
+    test_limit_within_window()
+    test_sliding_across_periods()
+    test_old_periods_are_dropped()
+    test_zero_limit_rejects_everything()
+    test_retry_after_header()
+    benchmark()
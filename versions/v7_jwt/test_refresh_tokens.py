@@ -0,0 +1,113 @@
+# test_refresh_tokens.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import crud
+from conftest import temp_database
+from models import User
+from auth import REFRESH_TOKEN_REUSE_GRACE_SECONDS
+
+
+@asynccontextmanager
+async def make_session(database):
+    async with database.sessions() as (engine, Session):
+        async with Session() as db:
+            db.add(User(username="robin", email="robin@qq.com", hashed_password="0" * 64))
+            await db.commit()
+        yield engine, Session
+
+
+def test_rotation_and_reuse_detection(database):
+    """刷新会轮换令牌；旧令牌在宽限期之后被重放时整个会话失效，token版本加1"""
+    async def run():
+        async with make_session(database) as (_, Session):
+            async with Session() as db:
+                user = await crud.get_user_by_id(db, 1)
+                first, record = await crud.create_refresh_token(db, user)
+                assert record.token_hash != first  # 只保存摘要
+
+                _, second, second_record = await crud.rotate_refresh_token(db, first)
+                assert second_record.family_id == record.family_id
+
+                replay_at = int(time.time()) + REFRESH_TOKEN_REUSE_GRACE_SECONDS + 1
+                try:
+                    await crud.rotate_refresh_token(db, first, now=replay_at)
+                except crud.RefreshTokenReused as e:
+                    assert e.user_id == 1
+                else:
+                    raise AssertionError("重放旧令牌应当被检测到")
+
+                # 同一会话中尚未使用的新令牌也已作废，且不会再次触发重放检测
+                try:
+                    await crud.rotate_refresh_token(db, second, now=replay_at)
+                except ValueError as e:
+                    assert not isinstance(e, crud.RefreshTokenReused)
+                else:
+                    raise AssertionError("会话应当已失效")
+                assert await crud.get_token_version(db, 1) == 1
+
+    asyncio.run(run())
+
+
+def test_sliding_expiry_is_capped(database):
+    """滑动过期时间不超过会话的绝对过期时间"""
+    async def run():
+        async with make_session(database) as (_, Session):
+            async with Session() as db:
+                user = await crud.get_user_by_id(db, 1)
+                now = int(time.time())
+                token, record = await crud.create_refresh_token(
+                    db, user, family_id="f" * 32, family_expires_at=now + 60
+                )
+                assert record.expires_at == now + 60
+                _, _, rotated = await crud.rotate_refresh_token(db, token)
+                assert rotated.expires_at <= now + 60
+
+    asyncio.run(run())
+
+
+def test_concurrent_refresh_keeps_session(database):
+    """同一个令牌的并发刷新（多个标签页、超时重试）都拿到新令牌，会话不会被当作重放作废"""
+    async def run():
+        async with make_session(database) as (_, Session):
+            async with Session() as db:
+                user = await crud.get_user_by_id(db, 1)
+                token, record = await crud.create_refresh_token(db, user)
+
+            async def attempt():
+                async with Session() as db:
+                    return await crud.rotate_refresh_token(db, token)
+
+            results = await asyncio.gather(*[attempt() for _ in range(5)])
+            new_tokens = {new_token for _, new_token, _ in results}
+            assert len(new_tokens) == 5
+            assert all(new_record.family_id == record.family_id for _, _, new_record in results)
+
+            async with Session() as db:
+                assert await crud.get_token_version(db, 1) == 0
+                # 每个并发请求拿到的新令牌都能继续使用
+                for new_token in new_tokens:
+                    await crud.rotate_refresh_token(db, new_token)
+
+                # 宽限期过后再用原令牌才是重放
+                try:
+                    await crud.rotate_refresh_token(
+                        db, token, now=int(time.time()) + REFRESH_TOKEN_REUSE_GRACE_SECONDS + 1
+                    )
+                except crud.RefreshTokenReused:
+                    pass
+                else:
+                    raise AssertionError("宽限期之后的重放应当被检测到")
+                assert await crud.get_token_version(db, 1) == 1
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    with temp_database() as database:
+        test_rotation_and_reuse_detection(database)
+    with temp_database() as database:
+        test_sliding_expiry_is_capped(database)
+    with temp_database() as database:
+        test_concurrent_refresh_keeps_session(database)
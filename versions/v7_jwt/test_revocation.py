@@ -0,0 +1,96 @@
+# test_revocation.py
+import asyncio
+import time
+import timeit
+
+import crud
+from conftest import temp_database
+from models import RevokedToken
+from revocation import RevocationList, sync_revocations
+
+
+def test_revocation_list():
+    """本地撤销立即生效，过期记录被清理"""
+    revocations = RevocationList()
+    now = int(time.time())
+    revocations.add("a", now + 60)
+    revocations.add("b", now - 1)
+    assert revocations.is_revoked("a")
+    assert not revocations.is_revoked("c")
+    assert not revocations.is_revoked(None)  # 旧token没有jti
+    assert revocations.prune() == 1
+    assert not revocations.is_revoked("b")
+    assert len(revocations) == 1
+
+
+def test_sync_between_workers(database):
+    """一个进程写入的撤销记录，另一个进程增量同步后可见；重复注销（包括并发）只保留一条记录"""
+    async def run():
+        async with database.sessions() as (_, Session):
+
+            worker = RevocationList()
+            now = int(time.time())
+            async with Session() as db:
+                await crud.revoke_token(db, "old", 1, now - 10)
+                await crud.revoke_token(db, "t1", 1, now + 600)
+                await crud.revoke_token(db, "t1", 1, now + 600)  # 重复注销
+
+            async def revoke(jti):
+                async with Session() as db:
+                    await crud.revoke_token(db, jti, 1, now + 600)
+
+            await asyncio.gather(*[revoke("t3") for _ in range(5)])
+            await sync_revocations(worker, Session)
+            assert worker.is_revoked("t1") and worker.is_revoked("t3") and len(worker) == 3
+            assert worker.synced_until >= now
+
+            async with Session() as db:
+                assert await crud.delete_expired_revocations(db, now) == 1
+                await crud.revoke_token(db, "t2", 2, now + 600)
+            await sync_revocations(worker, Session)
+            assert worker.is_revoked("t2")
+            assert worker.stats["synced"] == 4  # 重复读到的记录不重复计数
+
+    asyncio.run(run())
+
+
+def test_sync_picks_up_late_commits(database):
+    """id较小、注销时间较早的记录在同步之后才提交（PostgreSQL并发事务），下次同步仍能读到"""
+    async def run():
+        async with database.sessions() as (_, Session):
+
+            worker = RevocationList()
+            now = int(time.time())
+            async with Session() as db:
+                db.add(RevokedToken(id=10, jti="fast", user_id=1, expires_at=now + 600, revoked_at=now))
+                await db.commit()
+            await sync_revocations(worker, Session, overlap=30)
+            assert worker.is_revoked("fast")
+
+            async with Session() as db:
+                db.add(RevokedToken(id=5, jti="slow", user_id=1, expires_at=now + 600, revoked_at=now - 5))
+                await db.commit()
+            await sync_revocations(worker, Session, overlap=30)
+            assert worker.is_revoked("slow")
+
+    asyncio.run(run())
+
+
+def benchmark():
+    """未撤销token的检查开销"""
+    revocations = RevocationList()
+    now = int(time.time())
+    for i in range(10000):
+        revocations.add(f"revoked-{i}", now + 1800)
+    n = 1_000_000
+    seconds = timeit.timeit(lambda: revocations.is_revoked("not-revoked"), number=n)
+    print(f"撤销列表 {len(revocations)} 条，单次检查 {seconds / n * 1e9:.0f}ns")
+
+
+if __name__ == "__main__":
+    test_revocation_list()
+    with temp_database() as database:
+        test_sync_between_workers(database)
+    with temp_database() as database:
+        test_sync_picks_up_late_commits(database)
+    benchmark()
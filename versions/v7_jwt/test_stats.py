@@ -0,0 +1,95 @@
+# test_stats.py
+import asyncio
+
+from conftest import temp_database
+from models import User, Post
+from stats import ReadinessCheck, StatsSnapshot, refresh_stats, watch_stats
+
+
+class BrokenDatabase:
+    """连不上的数据库"""
+
+    def connect(self):
+        raise ConnectionError("数据库不可用")
+
+    session = connect
+
+
+async def wait_until(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "等待超时"
+        await asyncio.sleep(0.001)
+
+
+def test_readiness_cached_and_coalesced(database):
+    """就绪检查在缓存期内和并发时只查询一次；数据库不可用时返回False"""
+    async def run():
+        async with database.engine() as engine:
+            check = ReadinessCheck(engine, ttl=60)
+            assert all(await asyncio.gather(*[check.check() for _ in range(20)]))
+            assert await check.check()
+            assert check.stats["queries"] == 1
+
+        check = ReadinessCheck(BrokenDatabase(), ttl=0)
+        assert not await check.check()
+        assert check.stats["failures"] == 1
+
+    asyncio.run(run())
+
+
+def test_stats_refreshed_in_background(database):
+    """统计数据由后台任务刷新；刷新失败时保留上一次的数据"""
+    async def run():
+        async with database.sessions() as (engine, Session):
+            snapshot = StatsSnapshot()
+            await refresh_stats(snapshot, Session)
+            assert snapshot.as_dict()["users_count"] == 0
+
+            async with Session() as db:
+                db.add(User(username="robin", email="robin@qq.com", hashed_password="0" * 64))
+                await db.commit()
+                db.add(Post(title="标题", content="内容", author_id=1))
+                await db.commit()
+            assert snapshot.users_count == 0  # 读取快照不查询数据库
+
+            # 等到刷新完成再取消：此时后台任务正在sleep，不会中断进行中的查询
+            task = asyncio.create_task(watch_stats(snapshot, Session, interval=0.01))
+            await wait_until(lambda: snapshot.users_count == 1)
+            assert snapshot.posts_count == 1
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+            task = asyncio.create_task(watch_stats(snapshot, BrokenDatabase().session, interval=0.01))
+            await wait_until(lambda: snapshot.error is not None)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            assert snapshot.users_count == 1
+
+    asyncio.run(run())
+
+
+def benchmark():
+    """缓存期内的就绪检查开销"""
+    async def run(database):
+        async with database.engine() as engine:
+            check = ReadinessCheck(engine, ttl=60)
+            await check.check()
+            n = 100000
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            for _ in range(n):
+                await check.check()
+            print(f"就绪检查（缓存命中）：{(loop.time() - start) / n * 1e9:.0f}ns/次，数据库查询 {check.stats['queries']} 次")
+
+    with temp_database() as database:
+        asyncio.run(run(database))
+
+
+if __name__ == "__main__":
+    with temp_database() as database:
+        test_readiness_cached_and_coalesced(database)
+    with temp_database() as database:
+        test_stats_refreshed_in_background(database)
+    benchmark()